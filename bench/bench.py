@@ -0,0 +1,295 @@
+"""Headless benchmarks of the editor startup and interaction latencies.
+
+Run from the repository root:
+
+    python bench/bench.py --output bench.json
+    python bench/bench.py --compare bench.json
+
+Results are printed and optionally saved as JSON, so runs of different
+versions can be compared with each other"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+from PyQt5.QtCore import QEvent, QObject, PYQT_VERSION_STR, QT_VERSION_STR
+from PyQt5.QtWidgets import QApplication
+
+SIZES = {"1kb": 1 << 10, "1mb": 1 << 20, "100mb": 100 << 20}
+
+LINE = "The quick brown fox jumps over the lazy dog, 0123456789.\n"
+
+
+class PaintWatcher(QObject):
+    """Remembers the moment of the first paint of the watched widget"""
+
+    def __init__(self):
+        super().__init__()
+        self.painted_at = None
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and self.painted_at is None:
+            self.painted_at = time.perf_counter()
+        return False
+
+
+class Bench:
+    def __init__(self, app, repeat):
+        self.app = app
+        self.repeat = repeat
+        self.results = {}
+
+    def record(self, name, samples):
+        samples = sorted(samples)
+
+        self.results[name] = {
+            "unit": "s",
+            "samples": len(samples),
+            "min": samples[0],
+            "median": statistics.median(samples),
+            "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+            "max": samples[-1],
+        }
+
+        print(f"{name:40} {statistics.median(samples) * 1000:10.3f} ms", flush=True)
+
+    def process_events(self):
+        self.app.processEvents()
+
+    def core(self):
+        from core import Core
+
+        core = Core()
+        core.show()
+        self.process_events()
+
+        return core
+
+    def close(self, core):
+        core.close()
+        core.deleteLater()
+        self.process_events()
+
+    def wait_loaded(self, core, buffer):
+        while buffer.loading or core.writers:
+            self.process_events()
+
+    def bench_startup(self):
+        from core import Core
+
+        construct, paint = [], []
+
+        for _ in range(self.repeat):
+            watcher = PaintWatcher()
+
+            start = time.perf_counter()
+            core = Core()
+            construct.append(time.perf_counter() - start)
+
+            core.installEventFilter(watcher)
+            core.show()
+
+            while watcher.painted_at is None:
+                self.process_events()
+
+            paint.append(watcher.painted_at - start)
+
+            core.removeEventFilter(watcher)
+            self.close(core)
+
+        self.record("core_construct", construct)
+        self.record("first_paint", paint)
+
+    def bench_files(self, sizes, directory):
+        from buffer import Buffer, Sync
+
+        for label in sizes:
+            path = os.path.join(directory, f"{label}.txt")
+
+            with open(path, mode="w") as file:
+                file.write(LINE * (SIZES[label] // len(LINE) + 1))
+
+            core = self.core()
+            opening = []
+
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                buffer = core.open_path(path)
+                self.wait_loaded(core, buffer)
+                opening.append(time.perf_counter() - start)
+
+                core.close_buffer(buffer)
+                self.process_events()
+
+            self.close(core)
+            self.record(f"open_file_{label}", opening)
+
+            buffer = Buffer(sync_file=path)
+            sync_from, sync_to = [], []
+
+            for _ in range(self.repeat):
+                start = time.perf_counter()
+                buffer.sync(Sync.FROM_FILE)
+                sync_from.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                buffer.sync(Sync.TO_FILE)
+                sync_to.append(time.perf_counter() - start)
+
+            self.record(f"buffer_sync_from_file_{label}", sync_from)
+            self.record(f"buffer_sync_to_file_{label}", sync_to)
+
+    def bench_typing(self, directory, keystrokes=200):
+        path = os.path.join(directory, "typing.txt")
+
+        with open(path, mode="w") as file:
+            file.write(LINE * (SIZES["1mb"] // len(LINE)))
+
+        core = self.core()
+        buffer = core.open_path(path)
+        self.wait_loaded(core, buffer)
+
+        gui_buffer = buffer.view
+        samples = []
+
+        for _ in range(keystrokes):
+            start = time.perf_counter()
+            gui_buffer.insert("x")
+            core.flush_events()
+            self.process_events()
+            samples.append(time.perf_counter() - start)
+
+        self.close(core)
+        self.record("keystroke_1mb", samples)
+
+    def bench_tab_switch(self, counts=(10, 500), switches=100):
+        for count in counts:
+            core = self.core()
+
+            for _ in range(count - 1):
+                core.create_new_file()
+
+            self.process_events()
+
+            tabbar = core.tabbar
+            samples = []
+
+            for i in range(switches):
+                start = time.perf_counter()
+                tabbar.setCurrentIndex(i % count)
+                self.process_events()
+                samples.append(time.perf_counter() - start)
+
+            self.close(core)
+            self.record(f"tab_switch_{count}_tabs", samples)
+
+    def bench_settings(self):
+        core = self.core()
+        samples = []
+
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            core.open_settings()
+            self.process_events()
+            samples.append(time.perf_counter() - start)
+
+            core.settings.close()
+            self.process_events()
+
+        self.close(core)
+        self.record("settings_open", samples)
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except OSError:
+        commit = None
+
+    return {
+        "commit": commit or None,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "pyqt": PYQT_VERSION_STR,
+        "platform": platform.platform(),
+    }
+
+
+def compare(results, baseline):
+    """Prints median changes of the results against the baseline ones"""
+
+    print(f"\n{'benchmark':40} {'baseline':>12} {'current':>12} {'change':>8}")
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        before, after = baseline[name]["median"], result["median"]
+        change = (after - before) / before * 100 if before else 0.0
+
+        print(
+            f"{name:40} {before * 1000:9.3f} ms {after * 1000:9.3f} ms {change:+7.1f}%"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", help="file to save the results to as JSON")
+    parser.add_argument("--compare", help="JSON results of a previous run")
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="number of runs of every benchmark"
+    )
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        choices=SIZES.keys(),
+        default=list(SIZES.keys()),
+        help="synthetic file sizes to open and sync",
+    )
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv[:1])
+    bench = Bench(app, args.repeat)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The editor keeps its database in the working directory
+        os.chdir(directory)
+
+        bench.bench_startup()
+        bench.bench_files(args.sizes, directory)
+        bench.bench_typing(directory)
+        bench.bench_tab_switch()
+        bench.bench_settings()
+
+        os.chdir(ROOT)
+
+    report = {"meta": metadata(), "results": bench.results}
+
+    if args.output is not None:
+        with open(args.output, mode="w") as file:
+            json.dump(report, file, indent=4)
+
+    if args.compare is not None:
+        with open(args.compare) as file:
+            compare(bench.results, json.load(file)["results"])
+
+
+if __name__ == "__main__":
+    main()
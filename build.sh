@@ -20,8 +20,10 @@ venv/bin/pyinstaller \
     --onefile \
     --noconsole \
     --paths src/modules \
+    --collect-submodules modules \
     --hidden-import charset_normalizer \
     --hidden-import PyQt5.QtPrintSupport \
+    --add-data "$PWD/src/grammars:grammars" \
     --workpath target/linux/build \
     --distpath target/linux/dist \
     --specpath target/linux \
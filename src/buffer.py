@@ -1,6 +1,10 @@
 from enum import Enum
 from pathlib import Path
-import charset_normalizer
+import codecs
+import os
+import shutil
+import tempfile
+import zlib
 
 from utils import FileType
 
@@ -10,6 +14,18 @@ DEFAULT_EMPTY_BUFFER_NAME = "Unnamed"
 # content with the buffer (Sync.FROM_FILE)
 Sync = Enum("Sync", ["FROM_FILE", "TO_FILE"])
 
+# Number of bytes from the beginning of a file used to guess its encoding
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# UTF-32 marks go first as the little-endian one starts with the UTF-16 mark
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf_32"),
+    (codecs.BOM_UTF32_BE, "utf_32"),
+    (codecs.BOM_UTF8, "utf_8_sig"),
+    (codecs.BOM_UTF16_LE, "utf_16"),
+    (codecs.BOM_UTF16_BE, "utf_16"),
+)
+
 
 class BufferException:
     pass
@@ -24,6 +40,135 @@ class EncodingGuessError(BufferException):
     """Exception raised with failed attempt of file encoding guess"""
 
 
+def detect_encoding(path):
+    """Guesses encoding of the file looking at its beginning only. Returns
+    (encoding, confirmed) pair, where confirmed is True if the encoding is
+    known for sure (by the byte order mark or the whole file being valid
+    UTF-8) rather than guessed. Encoding is None if failed to guess it"""
+
+    with open(path, mode="rb") as file:
+        sample = file.read(ENCODING_SAMPLE_SIZE)
+        whole = file.read(1) == b""
+
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding, True
+
+    try:
+        # The sample may end in the middle of a multibyte character
+        codecs.getincrementaldecoder("utf_8")().decode(sample, final=whole)
+        return "utf_8", whole
+    except UnicodeDecodeError:
+        pass
+
+    return guess_encoding(sample), False
+
+
+def guess_encoding(data):
+    """Returns the most likely encoding of the bytes or None"""
+
+    # charset_normalizer takes time to import, so it's done on the first use
+    import charset_normalizer
+
+    guess = charset_normalizer.from_bytes(data).best()
+
+    return None if guess is None else guess.encoding
+
+
+def decode_text(data, encoding, confirmed):
+    """Decodes the file content with the (encoding, confirmed) pair returned
+    by detect_encoding. Returns (text, encoding, confirmed) where the encoding
+    is guessed again from the whole content if the one guessed from its
+    beginning doesn't fit the rest. Content of unknown encoding is decoded as
+    UTF-8 with undecodable bytes escaped. Raises UnicodeDecodeError if the
+    confirmed encoding doesn't fit"""
+
+    if encoding is not None:
+        try:
+            return data.decode(encoding), encoding, confirmed
+        except UnicodeDecodeError:
+            if confirmed:
+                raise
+
+        encoding = guess_encoding(data)
+
+        if encoding is not None:
+            try:
+                return data.decode(encoding), encoding, False
+            except UnicodeDecodeError:
+                pass
+
+    return data.decode("utf-8", "backslashreplace"), None, False
+
+
+def file_stat(path):
+    """Returns (size, modification time) of the file, which change when the
+    file gets changed"""
+
+    stat = os.stat(path)
+
+    return stat.st_size, stat.st_mtime_ns
+
+
+def compress_text(text):
+    """Returns the text compressed to be kept in memory"""
+
+    return zlib.compress(text.encode("utf-8", "surrogatepass"))
+
+
+def decompress_text(data):
+    return zlib.decompress(data).decode("utf-8", "surrogatepass")
+
+
+def expand_paths(paths):
+    """Returns the paths with directories replaced by the files right in them
+    in the alphabetical order. Hidden files of the directories are skipped"""
+
+    expanded = []
+
+    for path in paths:
+        if not os.path.isdir(path):
+            expanded.append(path)
+            continue
+
+        with os.scandir(path) as entries:
+            expanded.extend(
+                sorted(
+                    entry.path
+                    for entry in entries
+                    if entry.is_file() and not entry.name.startswith(".")
+                )
+            )
+
+    return expanded
+
+
+def write_file(path, text, encoding=None, fsync=False):
+    """Atomically replaces the file content with the text. The text is written
+    to a temporary file in the same directory first, which then gets renamed
+    over the original file, so a failure never leaves it half-written. If
+    fsync is True, the data is flushed to the disk before renaming"""
+
+    path = os.path.realpath(path)
+    fd, temp = tempfile.mkstemp(prefix=".", suffix=".tetra", dir=os.path.dirname(path))
+
+    try:
+        with open(fd, mode="w", encoding=encoding or "utf-8") as file:
+            file.write(text)
+
+            if fsync:
+                file.flush()
+                os.fsync(file.fileno())
+
+        if os.path.exists(path):
+            shutil.copymode(path, temp)
+
+        os.replace(temp, path)
+    except BaseException:
+        os.remove(temp)
+        raise
+
+
 class Buffer:
     """Abstract text editing buffer"""
 
@@ -32,6 +177,10 @@ class Buffer:
         empty_name=DEFAULT_EMPTY_BUFFER_NAME,
         sync_file=None,
         text="",
+        view=None,
+        read=True,
+        encoding=None,
+        encoding_stat=None,
     ):
         """Initializes a buffer
 
@@ -39,74 +188,168 @@ class Buffer:
         empty_name - name of the buffer without file to sync with
         sync_file  - file to sync with
         text       - starting content of the buffer
+        view       - graphical buffer whose document holds the actual text
+                     after the first edit
+        read       - whether to read the sync file content right away
+        encoding   - (encoding, confirmed) pair of the sync file if it's
+                     known already, otherwise the encoding gets detected
+        encoding_stat - file_stat of the sync file the passed encoding was
+                     determined for if it's known
 
         """
 
         self.empty_name = empty_name
+        self.view = view
         self.text = text
         self.file = None
         self.file_encoding = None
+        self.encoding_confirmed = False
         self.full_encoding = None
+
+        # File stat of the sync file when its encoding was determined
+        self.encoding_stat = None
         self.synchronized = sync_file is not None
 
+        # Number of the text version, changes with every edit
+        self.revision = 0
+
+        # Whether the sync file content is being read into the linked
+        # graphical buffer
+        self.loading = False
+
         self.refresh_name()
 
         if sync_file is not None:
-            self.set_sync_file(sync_file)
-            self.sync(Sync.FROM_FILE)
+            self.set_sync_file(sync_file, detect_encoding=encoding is None)
+
+            if encoding is not None:
+                self.file_encoding, self.encoding_confirmed = encoding
+                self.encoding_stat = encoding_stat
+
+            if read:
+                self.sync(Sync.FROM_FILE)
 
     def __str__(self):
         return f"{self.__class__.__name__}(name='{self.name}', synchronized={self.synchronized})"
 
-    def set_sync_file(self, file):
-        Path(file).touch()
+    def set_sync_file(self, file, detect_encoding=True):
+        """Links the buffer with the file. If detect_encoding is False, the
+        current encoding of the buffer is kept (e.g. when saving it as another
+        file)"""
+
+        # Touching an existing file would change its modification time
+        if not Path(file).exists():
+            Path(file).touch()
+
         self.file = file
-        self.file_encoding = self.determine_encoding()
+        self.refresh_name()
+
+        if detect_encoding:
+            self.encoding_stat = file_stat(file)
+            self.file_encoding, self.encoding_confirmed = self.determine_encoding()
+
+    @property
+    def text(self):
+        """Text of the buffer. After the linked graphical buffer gets edited,
+        the text is taken from its document only when someone asks for it"""
+
+        if self._text is None:
+            return self.view.get_text()
+
+        return self._text
+
+    @text.setter
+    def text(self, text):
+        self._text = text
 
     def set_text(self, text):
         self.text = text
         self.desync()
 
+    def mark_edited(self):
+        """Notifies the buffer that the document of the linked graphical buffer
+        was edited. The own copy of the text gets dropped instead of being
+        refreshed, so the cost doesn't depend on the text size"""
+
+        self.drop_text()
+        self.desync()
+
+    def drop_text(self):
+        """Drops own copy of the text, so that it's taken from the linked
+        graphical buffer from now on"""
+
+        if self.view is not None:
+            self._text = None
+
+    def length(self):
+        """Returns length of the buffer text without copying it"""
+
+        if self._text is None:
+            return self.view.text_length()
+
+        return len(self._text)
+
     def determine_encoding(self):
-        """Tries to guess the encoding of the linked sync file. Raises
-        NoSyncFileError if there's no sync file linked within buffer"""
+        """Tries to guess the encoding of the linked sync file. Returns
+        (encoding, confirmed) pair like detect_encoding. Raises NoSyncFileError
+        if there's no sync file linked within buffer"""
 
         if self.file is None:
             raise NoSyncFileError
 
-        guess = charset_normalizer.from_path(self.file).best()
+        return detect_encoding(self.file)
 
-        if guess is None:
-            return None
+    __determine_encoding = determine_encoding
+
+    def encoding_current(self):
+        """Returns whether the sync file wasn't changed since its encoding
+        was determined"""
+
+        try:
+            return self.encoding_stat == file_stat(self.file)
+        except OSError:
+            return False
+
+    def refresh_encoding(self):
+        """Determines the encoding of the sync file again if the file was
+        changed since it was determined"""
+
+        if self.encoding_current():
+            return
+
+        self.encoding_stat = file_stat(self.file)
+        self.file_encoding, self.encoding_confirmed = self.determine_encoding()
+
+    def read_file(self):
+        """Returns the sync file content decoded with its encoding. The
+        encoding gets guessed again if the guessed one doesn't fit the whole
+        file"""
 
-        return guess.encoding
+        with open(self.file, mode="rb") as file:
+            stat = os.fstat(file.fileno())
+            data = file.read()
+
+        text, self.file_encoding, self.encoding_confirmed = decode_text(
+            data, self.file_encoding, self.encoding_confirmed
+        )
+        self.encoding_stat = stat.st_size, stat.st_mtime_ns
+
+        return text
 
     def sync(self, kind=Sync.TO_FILE):
         """Synchronizes text of the buffer with a file content
         (kind=Sync.TO_FILE) or file content with the text of the buffer
         (kind=Sync.FROM_FILE). Raises NoSyncFileError if there's no linked sync
-        file or EncodingGuessError if failed to determine file encoding"""
+        file or UnicodeDecodeError if the file doesn't fit its confirmed
+        encoding"""
 
         if self.file is None:
             raise NoSyncFileError
 
         if kind == Sync.TO_FILE:
-            mode = "w"
-        else:
-            mode = "r"
-
-        if self.file_encoding is None:
-            mode += "b"
-
-        file = open(self.file, mode=mode, encoding=self.file_encoding)
-
-        if kind == Sync.TO_FILE:
-            file.write(self.text)
+            write_file(self.file, self.text, self.file_encoding)
         else:
-            self.text = file.read()
-            self._sync()
-
-        file.close()
+            self.text = self.read_file()
 
         self.synchronized = True
 
@@ -122,6 +365,20 @@ class Buffer:
     def desync(self):
         """Desyncs buffer with the linked sync file"""
         self.synchronized = False
+        self.revision += 1
+
+    def saved(self, revision):
+        """Marks the buffer synchronized after its text of the passed revision
+        was written to the sync file, unless it was edited since then. The
+        file has the encoding of the buffer now"""
+
+        if revision == self.revision:
+            self._sync()
+
+        try:
+            self.encoding_stat = file_stat(self.file)
+        except OSError:
+            self.encoding_stat = None
 
     def refresh_name(self):
         """Refreshes name of the buffer according to the name of the linked sync file"""
@@ -137,7 +394,7 @@ class Buffer:
 
     def is_empty(self):
         """Returns whether the buffer has no linked file and is empty"""
-        return self.name == self.empty_name and self.text == ""
+        return self.name == self.empty_name and self.length() == 0
 
 
 class BufManager:
@@ -154,9 +411,13 @@ class BufManager:
                    abstract buffer
         """
 
-        self.buffers[gui_link] = Buffer(*args, **kwargs)
+        buffer = Buffer(*args, view=gui_link, **kwargs)
+
+        self.buffers[gui_link] = buffer
         self.current_link = gui_link
 
+        return buffer
+
     def current(self):
         return self.buffers[self.current_link]
 
@@ -165,7 +426,7 @@ class BufManager:
 
     def add_empty(self, gui_link):
         """Add empty buffer"""
-        self.add(gui_link)
+        return self.add(gui_link)
 
     def remove(self, gui_link, new_current=None):
         """Removes buffer"""
@@ -186,16 +447,33 @@ class BufManager:
         """Returns buffer linked with the current graphical one"""
         return self.buffers[gui_link]
 
+    def relink(self, gui_link, new_gui_link):
+        """Links the buffer of the graphical one with the new graphical
+        buffer"""
+
+        buffer = self.buffers.pop(gui_link)
+        buffer.view = new_gui_link
+        self.buffers[new_gui_link] = buffer
+
+        if self.current_link is gui_link:
+            self.current_link = new_gui_link
+
+        return buffer
+
 
 class GuiBuffer:
     """General graphical buffer class"""
 
+    # Whether the graphical buffer only stands in for the editing one
+    placeholder = False
+
     def __init__(self):
         self.buffer = ""
         self.supports_syntax_highlighting = False
+        self.text_changed_hook = lambda: None
 
     def text_changed(self, func):
-        self.text_changed_hook = func()
+        self.text_changed_hook = func
 
     def set_text(self, text):
         self.buffer = text
@@ -203,3 +481,22 @@ class GuiBuffer:
 
     def get_text(self):
         return self.buffer
+
+    def text_length(self):
+        return len(self.buffer)
+
+    def append_text(self, text):
+        self.buffer += text
+        self.text_changed_hook()
+
+    def begin_loading(self):
+        """Prepares the buffer to be filled with the file content"""
+
+    def end_loading(self):
+        """Makes the buffer usual after it was filled with the file content"""
+
+    def get_position(self):
+        """Returns the cursor and scroll position which can be restored later"""
+
+    def set_position(self, position):
+        """Restores the position returned by get_position"""
@@ -0,0 +1,48 @@
+"""Outline of the classes and functions of Python code. Code is parsed in a
+worker process, so everything here must be importable and picklable without
+the running editor"""
+
+import ast
+
+# Kinds of the outline symbols by the types of their nodes
+SYMBOL_KINDS = {
+    ast.ClassDef: "class",
+    ast.FunctionDef: "def",
+    ast.AsyncFunctionDef: "async def",
+}
+
+
+def symbols(node):
+    """Returns (kind, name, line, column, children) symbols of the classes
+    and functions defined in the node, including the ones in its compound
+    statements. Lines are counted from zero, columns are in bytes"""
+
+    found = []
+
+    for child in ast.iter_child_nodes(node):
+        kind = SYMBOL_KINDS.get(type(child))
+
+        # Expressions can't define anything but lambdas
+        if kind is None:
+            if not isinstance(child, ast.expr):
+                found.extend(symbols(child))
+            continue
+
+        found.append(
+            (kind, child.name, child.lineno - 1, child.col_offset, symbols(child))
+        )
+
+    return found
+
+
+def parse_outline(source):
+    """Returns (symbols, error) pair of the source code as bytes or text.
+    Symbols are None if it can't be parsed and error tells why"""
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError) as error:
+        line = getattr(error, "lineno", None)
+        return None, str(error) if line is None else f"line {line}: {error.msg}"
+
+    return symbols(tree), None
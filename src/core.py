@@ -1,15 +1,80 @@
-import modules
-
-from buffer import BufManager, GuiBuffer
+import importlib
+import os
+
+from bisect import bisect_left
+from collections import deque
+
+from buffer import (
+    BufManager,
+    GuiBuffer,
+    Sync,
+    compress_text,
+    decompress_text,
+    expand_paths,
+)
 from modules import MODULES
 from event import Event, apply_event
-from module import Module
+from module import Module, ModuleStub
+from profiler import ProfilerDialog, profiler
+from setting import SettingsStore
 from settings import Settings
 from ui import Ui_MainWindow
 from utils import SaveStatus
+from worker import FileOpener, FileReader, FileWriter
 
 from PyQt5 import uic
-from PyQt5.QtWidgets import QFileDialog, QMainWindow, QMessageBox
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtWidgets import (
+    QAction,
+    QFileDialog,
+    QMainWindow,
+    QMessageBox,
+    QProgressDialog,
+    QWidget,
+)
+
+# How many last raised events are remembered by the core
+EVENT_HISTORY_LENGTH = 32
+
+# Files bigger than that number of bytes are read in background
+BACKGROUND_OPEN_SIZE = 1 << 20
+
+# Time in milliseconds after which the file opening progress gets shown
+OPEN_PROGRESS_DELAY = 500
+
+# Time in milliseconds changed settings are collected for before being written
+SETTINGS_FLUSH_DELAY = 1000
+
+# Number of lines shown above the one gone to
+GO_TO_CONTEXT_LINES = 5
+
+
+class PlaceholderGuiBuffer(QWidget, GuiBuffer):
+    """Lightweight stand-in for the editing buffer of a tab which wasn't
+    activated yet. Text of the buffer is the content of its sync file unless
+    the passed text is kept compressed instead. Already compressed text may be
+    passed as well"""
+
+    placeholder = True
+
+    def __init__(self, position=None, text=None, compressed=None):
+        QWidget.__init__(self)
+
+        self.buffer = None
+        self.position = position
+        self.compressed = compressed if text is None else compress_text(text)
+
+    def get_text(self):
+        if self.compressed is not None:
+            return decompress_text(self.compressed)
+
+        return self.buffer.read_file()
+
+    def text_length(self):
+        return len(self.get_text())
+
+    def get_position(self):
+        return self.position
 
 
 class Core(QMainWindow, Ui_MainWindow):
@@ -19,14 +84,38 @@ class Core(QMainWindow, Ui_MainWindow):
         super().__init__()
 
         self.modules = {}
+        self.loaders = {}
+        self.writers = {}
+        self.openers = []
+        self.settings = None
 
         self.init_event_system()
+        self.init_settings_store()
         self.init_ui()
         self.init_modules()
         self.init_buffer_manager()
 
+        self.raise_event(Event.EDITOR_STARTED)
+
     def init_event_system(self):
-        self.events = []
+        self.events = deque(maxlen=EVENT_HISTORY_LENGTH)
+        self.subscribers = {}
+        self.pending_events = {}
+
+        self.events_timer = QTimer(self)
+        self.events_timer.setSingleShot(True)
+        self.events_timer.timeout.connect(self.flush_events)
+
+        if profiler.enabled:
+            profiler.instrument_core(self)
+
+    def init_settings_store(self):
+        self.setting_store = SettingsStore()
+
+        self.settings_timer = QTimer(self)
+        self.settings_timer.setSingleShot(True)
+        # Looked up on timeout, since the database injects its own method
+        self.settings_timer.timeout.connect(lambda: self.flush_settings())
 
     def last_event(self):
         try:
@@ -36,25 +125,41 @@ class Core(QMainWindow, Ui_MainWindow):
 
     def init_buffer_manager(self):
         self.buffers = BufManager()
-        self.buffers.add_empty(self.gui_buffer_instance())
-        self.raise_event(Event.NEW_BUFFER_CREATED)
+        buffer = self.buffers.add_empty(self.gui_buffer_instance())
+        self.raise_event(Event.NEW_BUFFER_CREATED, buffer)
 
     def init_ui(self):
         self.setupUi(self)
         self.setCentralWidget(self.global_layout_widget)
 
+        self.profiler_action = QAction("Profiler", self)
+        self.profiler_action.setVisible(profiler.enabled)
+        self.help_menu.addAction(self.profiler_action)
+
     def init_module(self, module):
         """Initializes an editor module"""
 
         # Трансформировать название_модуля в НазваниеМодуля
         module_class = "".join(word.title() for word in module.split("_"))
 
-        return eval(f"modules.{module}.{module_class}(self)")
+        mod = getattr(importlib.import_module(f"modules.{module}"), module_class)(self)
+
+        if profiler.enabled:
+            profiler.instrument_module(mod)
+
+        self.setting_store.track(mod)
+
+        return mod
 
     def init_modules(self):
-        """Initializes all editor modules"""
+        """Initializes all editor modules. Disabled modules aren't imported,
+        placeholders are put instead of them"""
 
         for module in MODULES:
+            if module != "database" and not self.module_enabled(module):
+                self.modules[module] = ModuleStub(module, self)
+                continue
+
             mod = self.init_module(module)
 
             if module == "database":
@@ -64,17 +169,76 @@ class Core(QMainWindow, Ui_MainWindow):
 
             self.modules[module] = mod
 
+    def module_enabled(self, id):
+        """Returns whether the module with the passed identifier is enabled
+        without importing it"""
+
+        return True
+
+    __module_enabled = module_enabled
+
+    def save_settings(self, modules):
+        """Saves settings of the passed modules to the settings store and
+        schedules writing of the changed ones. Returns the change set"""
+
+        changes = self.setting_store.commit(modules)
+
+        if self.setting_store.dirty and not self.settings_timer.isActive():
+            self.settings_timer.start(SETTINGS_FLUSH_DELAY)
+
+        return changes
+
+    def flush_settings(self, wait=False):
+        """Writes the changed settings, in background unless told to wait for
+        the writing to finish. Without the database they aren't written
+        anywhere"""
+
+        self.settings_timer.stop()
+        self.setting_store.take_dirty()
+
+    __flush_settings = flush_settings
+
+    def cached_encodings(self, paths):
+        """Returns (size, mtime, encoding, confirmed) of the files remembered
+        the last time their encodings were determined by their paths. Without
+        the database nothing is remembered"""
+
+        return {}
+
+    __cached_encodings = cached_encodings
+
+    def remember_encodings(self, rows):
+        """Remembers encodings of the files as (path, size, mtime, encoding,
+        confirmed) rows"""
+
+    __remember_encodings = remember_encodings
+
+    def enable_module(self, id):
+        """Imports and enables the module which was disabled on startup"""
+
+        mod = self.init_module(id)
+        self.modules[id] = mod
+        mod.enable()
+
+        return mod
+
     def unload_modules(self):
         """Unloads the inner editor modules"""
 
         for module in filter(Module.is_loaded, self.modules.values()):
             module.unload()
 
-    def refresh_modules(self):
-        """Refresh states of the inner editor modules"""
+    def subscribe(self, module):
+        """Subscribes the module to the events it handles"""
 
-        for module in filter(Module.is_loaded, self.modules.values()):
-            module.refresh()
+        for event in module.events:
+            self.subscribers.setdefault(event, {})[module] = None
+
+    def unsubscribe(self, module):
+        """Unsubscribes the module from all the events"""
+
+        for event in module.events:
+            self.subscribers.get(event, {}).pop(module, None)
 
     def find_module(self, id):
         """Returns a module with the passed identifier"""
@@ -84,12 +248,60 @@ class Core(QMainWindow, Ui_MainWindow):
     def closeEvent(self, event):
         """Hook which gets ran when the program's being closed"""
 
+        self.flush_events()
+
+        for loader in self.loaders.values():
+            loader.cancel()
+            loader.wait()
+
+        for writer in self.writers.values():
+            writer.wait()
+
+        for opener in self.openers:
+            opener.requestInterruption()
+            opener.wait()
+
+        self.raise_event(Event.EDITOR_CLOSING)
+        self.flush_settings(wait=True)
         self.unload_modules()
+
+        if profiler.enabled:
+            profiler.dump()
+
         event.accept()
 
-    def raise_event(self, event):
+    def raise_event(self, event, payload=None):
+        """Raises the event and refreshes the modules subscribed to it.
+        Payload is an event-specific object, usually the affected buffer.
+        Posted events get raised before the new one to keep the order"""
+
+        if self.pending_events:
+            self.flush_events()
+
         self.events.append(event)
-        self.refresh_modules()
+
+        for module in tuple(self.subscribers.get(event, ())):
+            module.refresh(event, payload)
+
+    def post_event(self, event, payload=None, delay=0):
+        """Raises the event after delay milliseconds (with zero delay on the
+        next event loop iteration). The same events with the same payloads
+        posted until then are collapsed into a single raise"""
+
+        self.pending_events[(event, payload)] = None
+
+        if not self.events_timer.isActive():
+            self.events_timer.start(delay)
+
+    def flush_events(self):
+        """Raises the posted events right away"""
+
+        self.events_timer.stop()
+
+        pending, self.pending_events = self.pending_events, {}
+
+        for event, payload in pending:
+            self.raise_event(event, payload)
 
     def gui_buffer_instance(self):
         """Creates and returns empty GUI editing buffer"""
@@ -99,27 +311,29 @@ class Core(QMainWindow, Ui_MainWindow):
 
     @apply_event(Event.NEW_BUFFER_CREATED)
     def create_new_file(self):
-        self.buffers.add_empty(self.gui_buffer_instance())
+        return self.buffers.add_empty(self.gui_buffer_instance())
+
+    def save_file(self, buffer=None, raise_event=True, done=None):
+        """Saves opened file. The file is written in background, done gets
+        called without arguments after it's written successfully"""
 
-    def save_file(self, buffer=None, raise_event=True):
-        """Saves opened file"""
+        self.flush_events()
 
         if buffer is None:
             buffer = self.buffers.current()
 
+        if buffer.loading:
+            return SaveStatus.CANCELED
+
         if buffer.file is None:
-            status = self.save_file_as(buffer, raise_event=raise_event)
-        else:
-            buffer.sync()
-            status = SaveStatus.SAVED
+            return self.save_file_as(buffer, raise_event=raise_event, done=done)
 
-        if raise_event:
-            self.raise_event(Event.FILE_SAVED)
+        self.write_buffer(buffer, Event.FILE_SAVED if raise_event else None, done)
 
-        return status
+        return SaveStatus.SAVED
 
-    def save_file_as(self, buffer=None, raise_event=True):
-        """Saves opened file as"""
+    def save_file_as(self, buffer=None, raise_event=True, done=None):
+        """Saves opened file as. Done is called like by save_file"""
 
         options = QFileDialog.Options()
 
@@ -134,31 +348,451 @@ class Core(QMainWindow, Ui_MainWindow):
         if buffer is None:
             buffer = self.buffers.current()
 
-        buffer.set_sync_file(path)
-        buffer.sync()
+        if buffer.loading:
+            return SaveStatus.CANCELED
 
-        if raise_event:
-            self.raise_event(Event.FILE_SAVED_AS)
+        buffer.set_sync_file(path, detect_encoding=buffer.file_encoding is None)
+        self.write_buffer(buffer, Event.FILE_SAVED_AS if raise_event else None, done)
 
         return status
 
-    @apply_event(Event.FILE_OPENED)
+    def write_buffer(self, buffer, event=None, done=None):
+        """Writes text of the buffer to its sync file in background. After
+        that the buffer gets synchronized (unless it was edited meanwhile), the
+        event gets raised with the buffer as the payload and done gets called.
+        Neither happens if writing fails"""
+
+        # Saves of the same buffer must not race with each other
+        if buffer in self.writers:
+            self.writers[buffer].wait()
+
+        writer = FileWriter(
+            buffer.file,
+            buffer.text,
+            buffer.file_encoding,
+            self.find_module("edit_buffer")["fsync_on_save"].get_value(),
+        )
+        revision = buffer.revision
+
+        def finish():
+            if self.writers.get(buffer) is writer:
+                del self.writers[buffer]
+
+            if writer.error is not None:
+                QMessageBox.warning(
+                    self, "Tetra Code Editor", f"Failed to save file: {writer.error}"
+                )
+                return
+
+            buffer.saved(revision)
+
+            if event is not None:
+                self.raise_event(event, buffer)
+
+            if done is not None:
+                done()
+
+        writer.finished.connect(finish)
+
+        self.writers[buffer] = writer
+        writer.start()
+
     def open_file(self):
-        """Opens existing file"""
+        """Opens existing files"""
 
-        path, _ = QFileDialog.getOpenFileName(self, "Открыть файл", "", "", "")
+        paths, _ = QFileDialog.getOpenFileNames(self, "Открыть файл", "", "", "")
 
-        if path == "":
+        if len(paths) == 1:
+            return self.open_path(paths[0])
+
+        return self.open_paths(paths)
+
+    def go_to(self, path, line, column=0):
+        """Makes the file current opening it if it isn't open yet and puts
+        the cursor at the line and column. The line gets scrolled into view
+        with a few lines above it"""
+
+        position = (line, column, max(line - GO_TO_CONTEXT_LINES, 0))
+        buffer = self.find_buffer(path)
+
+        if buffer is None:
+            return self.open_path(os.path.realpath(path), position)
+
+        self.tabbar.setCurrentIndex(self.tabbar.indexOf(buffer.view))
+
+        if not buffer.loading:
+            buffer.view.set_position(position)
+            buffer.view.setFocus()
+
+        return buffer
+
+    def find_buffer(self, path):
+        """Returns the open buffer of the file or None"""
+
+        path = os.path.realpath(path)
+
+        for buffer in self.buffers.buffers.values():
+            if buffer.file is not None and os.path.realpath(buffer.file) == path:
+                return buffer
+
+        return None
+
+    def open_paths(self, paths):
+        """Opens the files, directories are opened as the files right in them.
+        Files are read and their encodings are detected in parallel in
+        background. Tabs get placeholders with the read text in the order of
+        the paths as soon as the files are read. After all of them are read the
+        first one becomes current, so FILE_OPENED is raised once"""
+
+        paths = expand_paths(paths)
+
+        if not paths:
+            return None
+
+        initial = self.buffers.current()
+        cached = self.cached_encodings(paths)
+        opener = FileOpener(paths, BACKGROUND_OPEN_SIZE, cached)
+
+        # Indices of the opened paths in the order of their tabs
+        opened = []
+        buffers = {}
+        errors = []
+
+        # Encodings determined by the opener rather than taken from the cache
+        detected = []
+
+        def add(idx, result, error):
+            if opener.isInterruptionRequested():
+                return
+
+            if error is not None:
+                errors.append(f"{paths[idx]}: {error}")
+                return
+
+            encoding, confirmed, stat, compressed = result
+            path = paths[idx]
+
+            if cached.get(path) != (*stat, encoding, confirmed):
+                detected.append((path, *stat, encoding, confirmed))
+
+            tab = bisect_left(opened, idx)
+            opened.insert(tab, idx)
+
+            buffers[idx] = self.open_placeholder(
+                paths[idx],
+                tab,
+                (encoding, confirmed),
+                compressed=compressed,
+                encoding_stat=stat,
+            )
+
+        def finish():
+            self.openers.remove(opener)
+
+            if detected:
+                self.remember_encodings(detected)
+
+            if opener.isInterruptionRequested():
+                return
+
+            if errors:
+                QMessageBox.warning(
+                    self,
+                    "Tetra Code Editor",
+                    "Failed to open files:\n" + "\n".join(errors),
+                )
+
+            if not buffers:
+                return
+
+            first = buffers[opened[0]]
+            self.tabbar.setCurrentIndex(self.tabbar.indexOf(first.view))
+
+            if self.buffers.buffers.get(initial.view) is initial and initial.is_empty():
+                self.close_buffer(initial)
+
+        opener.file_read.connect(add)
+        opener.finished.connect(finish)
+
+        self.openers.append(opener)
+        opener.start()
+
+        return opener
+
+    def open_path(self, path, position=None):
+        """Opens the file located at the path and restores the cursor and
+        scroll position if it's passed. Big files are read in background and
+        fed to the editing buffer chunk by chunk. Returns the buffer or None if
+        the file can't be decoded"""
+
+        read = os.path.getsize(path) <= BACKGROUND_OPEN_SIZE
+        view = self.gui_buffer_instance()
+
+        try:
+            buffer = self.buffers.add(view, sync_file=path, read=read)
+        except UnicodeError as error:
+            QMessageBox.warning(
+                self, "Tetra Code Editor", f"Failed to open file: {error}"
+            )
+
+            if isinstance(view, QWidget):
+                view.deleteLater()
+
+            return None
+
+        self.raise_event(Event.FILE_OPENED, buffer)
+
+        if read:
+            buffer.view.set_position(position)
+        else:
+            self.load_buffer(buffer, position)
+
+        return buffer
+
+    def open_placeholder(
+        self,
+        path,
+        idx,
+        encoding=None,
+        position=None,
+        compressed=None,
+        encoding_stat=None,
+    ):
+        """Opens the file in a tab at the index without reading it unless its
+        compressed text is passed. The tab gets a placeholder instead of the
+        editing buffer until it's activated. Encoding is (encoding, confirmed)
+        pair if it's known already and encoding_stat is the file_stat of the
+        file it was determined for"""
+
+        current = self.buffers.current_link
+        view = PlaceholderGuiBuffer(position, compressed=compressed)
+
+        buffer = self.buffers.add(
+            view,
+            sync_file=path,
+            read=False,
+            encoding=encoding,
+            encoding_stat=encoding_stat,
+        )
+        buffer.drop_text()
+        view.buffer = buffer
+
+        self.buffers.switch(current)
+        self.find_module("tabbar").insert_tab(idx, buffer)
+
+        return buffer
+
+    def wake_buffer(self, buffer):
+        """Puts the editing buffer in place of the placeholder of the buffer
+        and fills it with the text"""
+
+        placeholder = buffer.view
+        view = self.gui_buffer_instance()
+
+        self.buffers.relink(placeholder, view)
+        self.find_module("tabbar").replace_tab(placeholder, buffer)
+
+        read = True
+
+        try:
+            if placeholder.compressed is not None:
+                buffer.text = placeholder.get_text()
+            else:
+                # Encoding remembered by the session or before hibernation is
+                # kept unless the file changed since then
+                buffer.refresh_encoding()
+                read = os.path.getsize(buffer.file) <= BACKGROUND_OPEN_SIZE
+
+                if read:
+                    buffer.sync(Sync.FROM_FILE)
+                else:
+                    buffer.text = ""
+        except (OSError, UnicodeError) as error:
+            QMessageBox.warning(
+                self, "Tetra Code Editor", f"Failed to open file: {error}"
+            )
+            buffer.text = ""
+
+        self.raise_event(Event.FILE_OPENED, buffer)
+
+        if read:
+            view.set_position(placeholder.position)
+        else:
+            self.load_buffer(buffer, placeholder.position)
+
+        placeholder.deleteLater()
+
+    def hibernate_buffer(self, buffer):
+        """Puts a placeholder in place of the editing buffer of the inactive
+        buffer releasing its widget and text. Text without unsaved changes is
+        read from the sync file again on activation, otherwise it's kept
+        compressed. Undo history of the buffer is lost"""
+
+        view = buffer.view
+        kept = buffer.file is None or not buffer.synchronized
+
+        placeholder = PlaceholderGuiBuffer(
+            view.get_position(), buffer.text if kept else None
+        )
+        placeholder.buffer = buffer
+
+        self.buffers.relink(view, placeholder)
+        buffer.drop_text()
+        self.find_module("tabbar").replace_tab(view, buffer)
+
+        view.deleteLater()
+
+    @apply_event(Event.FILE_RELOADED)
+    def reload_buffer(self, buffer, offset=None):
+        """Replaces text of the buffer with the content of its sync file
+        discarding unsaved changes. If the offset is passed, the file is
+        considered grown and only the bytes after the offset get appended"""
+
+        view = buffer.view
+
+        if view.placeholder:
+            view.compressed = None
+            buffer._sync()
+            return buffer
+
+        position = view.get_position()
+        size = os.path.getsize(buffer.file)
+
+        # Text put by the editor itself isn't an edit
+        reloaded = False
+        buffer.loading = True
+        view.begin_loading()
+
+        try:
+            if offset is not None:
+                with open(buffer.file, mode="rb") as file:
+                    file.seek(offset)
+                    data = file.read(size - offset)
+
+                # A guessed encoding may not fit the appended bytes
+                view.append_text(
+                    data.decode(
+                        buffer.file_encoding or "utf-8",
+                        "strict" if buffer.encoding_confirmed else "backslashreplace",
+                    )
+                )
+            elif size <= BACKGROUND_OPEN_SIZE:
+                buffer.sync(Sync.FROM_FILE)
+                view.set_text(buffer.text)
+                buffer.drop_text()
+            else:
+                view.set_text("")
+
+            reloaded = True
+        except (OSError, UnicodeError) as error:
+            QMessageBox.warning(
+                self, "Tetra Code Editor", f"Failed to reload file: {error}"
+            )
+        finally:
+            view.end_loading()
+            buffer.loading = False
+
+        # The text differs from the file content now
+        if not reloaded:
+            buffer.desync()
+            return buffer
+
+        buffer._sync()
+
+        if offset is None and size > BACKGROUND_OPEN_SIZE:
+            self.load_buffer(buffer, position)
+        else:
+            view.set_position(position)
+
+        return buffer
+
+    def load_buffer(self, buffer, position=None):
+        """Reads the sync file content into the graphical buffer in background
+        showing the progress and then restores the position. The user may
+        cancel loading, then the buffer gets closed"""
+
+        size = max(os.path.getsize(buffer.file), 1)
+
+        progress = QProgressDialog(f"Opening {buffer.name}...", "Cancel", 0, 100, self)
+        progress.setWindowModality(Qt.NonModal)
+        progress.setMinimumDuration(OPEN_PROGRESS_DELAY)
+        progress.setValue(0)
+
+        loader = FileReader(
+            buffer.file, buffer.file_encoding, buffer.encoding_confirmed
+        )
+
+        def feed(text, read):
+            if self.buffers.buffers.get(buffer.view) is not buffer:
+                loader.cancel()
+
+            if loader.canceled:
+                return
+
+            buffer.view.append_text(text)
+            progress.setValue(read * 100 // size)
+
+        def finish():
+            del self.loaders[buffer]
+
+            progress.canceled.disconnect(loader.cancel)
+            progress.close()
+
+            buffer.view.end_loading()
+            buffer.loading = False
+
+            if loader.error is not None:
+                QMessageBox.warning(
+                    self, "Tetra Code Editor", f"Failed to open file: {loader.error}"
+                )
+
+            if loader.error is not None or loader.canceled:
+                self.close_buffer(buffer)
+            else:
+                buffer.view.set_position(position)
+
+        buffer.loading = True
+        buffer.drop_text()
+        buffer.view.begin_loading()
+
+        loader.chunk_read.connect(feed)
+        loader.finished.connect(finish)
+        progress.canceled.connect(loader.cancel)
+
+        self.loaders[buffer] = loader
+        loader.start()
+
+    def close_buffer(self, buffer):
+        """Closes tab of the buffer without asking anything"""
+
+        if self.buffers.buffers.get(buffer.view) is not buffer:
             return
 
-        self.buffers.add(self.gui_buffer_instance(), sync_file=path)
+        if len(self.buffers) == 1:
+            self.create_new_file()
+
+        self.find_module("tabbar").remove_tab_and_buffer(
+            self.tabbar.indexOf(buffer.view)
+        )
 
     @apply_event(Event.SETTINGS_OPENED)
     def open_settings(self):
-        """Opens editor's settings dialogue window"""
+        """Opens editor's settings dialogue window. The window is built once
+        and then only synchronized with the modules"""
+
+        if self.settings is None:
+            self.settings = Settings(self)
+        else:
+            self.settings.sync()
 
-        self.settings = Settings(self)
         self.settings.show()
+        self.settings.raise_()
+        self.settings.activateWindow()
+
+    def open_profiler(self):
+        """Opens dialogue window with the collected profiling metrics"""
+
+        ProfilerDialog(profiler, self).exec()
 
     @apply_event(Event.ABOUT_DIALOG_OPENED)
     def open_about_dialog(self):
@@ -18,6 +18,9 @@ Event = Enum(
         "TAB_CLOSED",
         "SETTINGS_SAVED",
         "SETTING_CHANGED",
+        "EDITOR_STARTED",
+        "EDITOR_CLOSING",
+        "FILE_RELOADED",
     ],
 )
 
@@ -33,6 +36,9 @@ EVENT_DESCRIPTIONS = {
     "TAB_CLOSED": "Tab was closed",
     "SETTINGS_SAVED": "Settings were saved",
     "SETTING_CHANGED": "Some of the setting were changed",
+    "EDITOR_STARTED": "Editor was started",
+    "EDITOR_CLOSING": "Editor is being closed",
+    "FILE_RELOADED": "File was changed outside and read again",
 }
 
 
@@ -42,13 +48,15 @@ def describe_event(event):
 
 def apply_event(event):
     """Decorator which applies an event on the program method. In other words,
-    calls event after some code execution."""
+    calls event after some code execution. Value returned by the method becomes
+    the event payload."""
 
     def wrapper(func):
         def wrapped_func(*args, **kwargs):
-            func(*args, **kwargs)
+            payload = func(*args, **kwargs)
             core = args[0]
-            core.raise_event(event)
+            core.raise_event(event, payload)
+            return payload
 
         return wrapped_func
 
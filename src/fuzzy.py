@@ -0,0 +1,236 @@
+"""Fuzzy matching of file paths for quick opening. A path matches the query
+if it has all the characters of the query in the same order.
+
+Paths are kept from the shortest to the longest. For every character there's
+a bit set of the paths having it, stored as a Python integer, so the paths
+having all the characters of the query are found by a few big integer
+operations. Only some of them get checked for the order of the characters and
+scored, which keeps ranking of hundreds of thousands of paths within a frame"""
+
+import bisect
+import itertools
+import os
+import re
+
+# Maximum number of the shortest matching paths scored for every query. Paths
+# whose file names contain the query are scored regardless of their length
+MAX_SCORED = 200
+
+# Score of a path having the query right in its file name, at the beginning of
+# it or having all the characters of the query in it
+NAME_SCORE = 100
+NAME_START_SCORE = 50
+NAME_FUZZY_SCORE = 50
+
+# Score of the most recently used path, less recent ones get less of it
+RECENCY_SCORE = 80
+
+# Maps bytes of zeros and ones to digits of a binary number
+BITS_TABLE = bytes.maketrans(b"\0\1", b"01")
+
+# Indices of the set bits of every byte
+BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def to_bits(flags):
+    """Returns the integer having the bits set at the indices of the true
+    flags"""
+
+    return int(bytes(flags)[::-1].translate(BITS_TABLE) or b"0", 2)
+
+
+def set_bits(bits):
+    """Yields indices of the set bits of the integer in ascending order"""
+
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+
+    for match in re.finditer(b"[^\0]", data):
+        byte = match.start()
+
+        for bit in BYTE_BITS[data[byte]]:
+            yield byte << 3 | bit
+
+
+def fuzzy_regex(query):
+    """Returns the regular expression finding the characters of the query in
+    the same order. Every character is taken at its first occurrence after the
+    previous one, so nothing is backtracked"""
+
+    chars = [re.escape(char) for char in query]
+
+    return re.compile(chars[0] + "".join(f"[^{char}]*{char}" for char in chars[1:]))
+
+
+class PathIndex:
+    """Relative paths of the files of a directory prepared for ranking"""
+
+    def __init__(self, root, paths=()):
+        self.root = root
+
+        paths = sorted(paths, key=lambda path: (len(path), path))
+
+        # Removed paths leave None in their places to keep the indices
+        self.paths = paths
+        self.lowered = [path.lower() for path in paths]
+        self.indices = {path: idx for idx, path in enumerate(paths)}
+
+        # Lowercased file names joined by newlines and the offsets where they
+        # start, which finds the names with the query in them at once
+        self.names = []
+        self.offsets = []
+        length = 0
+
+        for lowered in self.lowered:
+            name = lowered[lowered.rfind(os.sep) + 1 :]
+            self.names.append(name)
+            self.offsets.append(length)
+            length += len(name) + 1
+
+        self.joined_names = "\n".join(self.names) + "\n"
+
+        self.bits = {
+            char: to_bits(char in lowered for lowered in self.lowered)
+            for char in set().union(*self.lowered)
+        }
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __contains__(self, path):
+        return path in self.indices
+
+    def add(self, path):
+        """Adds the path after all the others"""
+
+        if path in self.indices:
+            return
+
+        idx = self.indices[path] = len(self.paths)
+        lowered = path.lower()
+        name = lowered[lowered.rfind(os.sep) + 1 :]
+
+        self.paths.append(path)
+        self.lowered.append(lowered)
+        self.names.append(name)
+        self.offsets.append(len(self.joined_names))
+        self.joined_names += name + "\n"
+
+        for char in set(lowered):
+            self.bits[char] = self.bits.get(char, 0) | 1 << idx
+
+    def remove(self, path):
+        idx = self.indices.pop(path, None)
+
+        if idx is None:
+            return
+
+        for char in set(self.lowered[idx]):
+            self.bits[char] &= ~(1 << idx)
+
+        self.paths[idx] = None
+
+    def candidates(self, query):
+        """Returns indices of the paths worth scoring for the query"""
+
+        found = []
+        bits = -1
+
+        for char in set(query):
+            bits &= self.bits.get(char, 0)
+
+        if not bits:
+            return found
+
+        search = fuzzy_regex(query).search
+        lowered = self.lowered
+
+        # Shortest paths go first
+        for idx in set_bits(bits):
+            if search(lowered[idx]):
+                found.append(idx)
+
+                if len(found) == MAX_SCORED:
+                    break
+
+        if os.sep in query:
+            return found
+
+        # Longer paths having the query in their file names
+        start = 0
+        names = self.joined_names
+
+        for _ in range(MAX_SCORED):
+            start = names.find(query, start)
+
+            if start == -1:
+                break
+
+            idx = bisect.bisect_right(self.offsets, start) - 1
+
+            if self.paths[idx] is not None:
+                found.append(idx)
+
+            start = self.offsets[idx] + len(self.names[idx]) + 1
+
+        return found
+
+    def score(self, idx, query, regex):
+        """Returns how well the path matches the query, more is better, or
+        None if it doesn't match"""
+
+        lowered = self.lowered[idx]
+        match = regex.search(lowered)
+
+        if match is None:
+            return None
+
+        name_start = len(lowered) - len(self.names[idx])
+
+        # Characters close to each other are better
+        score = match.start() - match.end()
+
+        found = lowered.find(query, name_start)
+
+        if found != -1:
+            score += NAME_SCORE + (NAME_START_SCORE if found == name_start else 0)
+        elif match.start() >= name_start or regex.search(lowered, name_start):
+            score += NAME_FUZZY_SCORE
+
+        return score
+
+    def rank(self, query, recent=(), limit=50):
+        """Returns up to limit paths matching the query from the best one.
+        Recent paths are the most recently used ones first, they are ranked
+        higher"""
+
+        query = "".join(query.lower().split())
+        indices = self.indices
+
+        if not query:
+            found = [path for path in recent if path in indices][:limit]
+            rest = (
+                path for path in self.paths if path is not None and path not in found
+            )
+
+            return found + list(itertools.islice(rest, limit - len(found)))
+
+        regex = fuzzy_regex(query)
+        bonuses = dict.fromkeys(self.candidates(query), 0)
+
+        for position, path in enumerate(recent):
+            if path in indices:
+                bonuses[indices[path]] = (
+                    RECENCY_SCORE * (len(recent) - position) // len(recent)
+                )
+
+        ranked = []
+
+        for idx, bonus in bonuses.items():
+            score = self.score(idx, query, regex)
+
+            if score is not None:
+                ranked.append((-score - bonus, len(self.paths[idx]), idx))
+
+        ranked.sort()
+
+        return [self.paths[idx] for _, _, idx in ranked[:limit]]
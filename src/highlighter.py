@@ -0,0 +1,319 @@
+"""Incremental syntax highlighting driven by declarative grammars.
+
+A grammar is a JSON file in the grammars directory:
+
+    {
+        "name": "Language name",
+        "extensions": ["ext"],
+        "styles": {"comment": {"color": "#007f00", "italic": true}},
+        "rules": [
+            {"style": "comment", "match": "#.*"},
+            {"style": "keyword", "words": ["if", "else"]},
+            {"style": "string", "begin": "\\"\\"\\"", "end": "\\"\\"\\""}
+        ]
+    }
+
+Rules are regular expressions tried in order. Rules with "begin" and "end"
+describe spans which may continue over multiple lines.
+
+Only the lines around the visible ones get styled, so the time it takes to see
+colored text doesn't depend on the size of the file. Lines far above the
+viewport are skipped and highlighted when they're scrolled to, starting from
+the default state"""
+
+import json
+import os
+import re
+
+from functools import lru_cache
+
+from PyQt5.Qsci import QsciLexerCustom, QsciScintilla
+from PyQt5.QtGui import QColor
+
+GRAMMARS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grammars")
+
+# Number of lines above the visible ones which get styled before them
+VISIBLE_MARGIN = 100
+
+# Bit of the Scintilla line state marking lines styled by the highlighter.
+# Lower bits keep the number of the span the line ends in
+STYLED = 1 << 16
+
+
+class GrammarError(Exception):
+    pass
+
+
+class Grammar:
+    """Compiled grammar: styles and rules recognizing tokens of a line"""
+
+    def __init__(self, data):
+        self.name = data["name"]
+        self.extensions = tuple(data.get("extensions", ()))
+
+        # Style 0 is the default one
+        self.styles = ["default", *data.get("styles", {})]
+        self.formats = [{}, *data.get("styles", {}).values()]
+
+        styles = {name: number for number, name in enumerate(self.styles)}
+
+        # Every rule is (style, end pattern of the span or None)
+        self.rules = []
+        patterns = []
+
+        for number, rule in enumerate(data["rules"]):
+            try:
+                style = styles[rule["style"]]
+            except KeyError:
+                raise GrammarError(f"{self.name}: unknown style {rule.get('style')}")
+
+            if "words" in rule:
+                pattern = r"\b(?:" + "|".join(map(re.escape, rule["words"])) + r")\b"
+            elif "begin" in rule:
+                pattern = rule["begin"]
+            else:
+                pattern = rule["match"]
+
+            end = re.compile(rule["end"]) if "begin" in rule else None
+
+            self.rules.append((style, end))
+            patterns.append(f"(?P<r{number}>{pattern})")
+
+        self.regex = re.compile("|".join(patterns))
+
+    def tokenize(self, line, state=0):
+        """Returns (start, end, style) tokens of the line and the state at its
+        end. State is zero or the number of the rule of the unfinished span
+        plus one"""
+
+        tokens = []
+        pos = 0
+
+        if state:
+            style, end = self.rules[state - 1]
+            match = end.search(line)
+
+            if match is None:
+                return [(0, len(line), style)], state
+
+            tokens.append((0, match.end(), style))
+            pos = match.end()
+
+        while (match := self.regex.search(line, pos)) is not None:
+            number = int(match.lastgroup[1:])
+            style, end = self.rules[number]
+
+            if match.end() == match.start():
+                pos += 1
+                continue
+
+            if end is None:
+                tokens.append((match.start(), match.end(), style))
+                pos = match.end()
+                continue
+
+            closing = end.search(line, match.end())
+
+            if closing is None:
+                tokens.append((match.start(), len(line), style))
+                return tokens, number + 1
+
+            tokens.append((match.start(), closing.end(), style))
+            pos = closing.end()
+
+        return tokens, 0
+
+
+def byte_tokens(text, tokens):
+    """Yields the (start, end, style) tokens of the text with their offsets
+    converted from characters to bytes of its UTF-8 encoding. Tokens go in
+    order, so every character gets encoded once"""
+
+    chars = 0
+    offset = 0
+
+    for start, end, style in tokens:
+        offset += len(text[chars:start].encode("utf-8"))
+        byte_start = offset
+        offset += len(text[start:end].encode("utf-8"))
+        chars = end
+
+        yield byte_start, offset, style
+
+
+@lru_cache(maxsize=None)
+def load_grammars(directory=GRAMMARS_DIR):
+    """Loads all the grammars of the directory and returns them by the file
+    extensions"""
+
+    grammars = {}
+
+    try:
+        names = sorted(os.listdir(directory))
+    except OSError:
+        return grammars
+
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+
+        with open(os.path.join(directory, name), encoding="utf-8") as file:
+            grammar = Grammar(json.load(file))
+
+        for ext in grammar.extensions:
+            grammars[ext] = grammar
+
+    return grammars
+
+
+def find_grammar(path):
+    """Returns the grammar of the file or None if there's no grammar for it"""
+
+    if path is None:
+        return None
+
+    return load_grammars().get(os.path.splitext(path)[1][1:])
+
+
+class Highlighter(QsciLexerCustom):
+    """Lexer styling the visible lines of the editor according to the grammar.
+    After edits lines get restyled from the first changed one, which is where
+    Scintilla asks to style from"""
+
+    def __init__(self, grammar, editor):
+        super().__init__(editor)
+
+        self.grammar = grammar
+
+        # Number of bytes styled in every line, None if they're styled whole
+        self.line_limit = None
+
+        for style, format in enumerate(grammar.formats):
+            if "color" in format:
+                self.setColor(QColor(format["color"]), style)
+
+            if "bold" in format or "italic" in format:
+                font = self.defaultFont(style)
+                font.setBold(format.get("bold", False))
+                font.setItalic(format.get("italic", False))
+                self.setFont(font, style)
+
+        editor.SCN_UPDATEUI.connect(self.scrolled)
+
+    def language(self):
+        return self.grammar.name
+
+    def description(self, style):
+        if style < len(self.grammar.styles):
+            return self.grammar.styles[style]
+
+        return ""
+
+    def styleText(self, start, end):
+        editor = self.editor()
+
+        if editor is None:
+            return
+
+        first = editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, start)
+        last = editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, end)
+
+        # Lines far above the viewport are skipped unless they're asked for
+        # explicitly
+        skip_to = self.first_visible_line() - VISIBLE_MARGIN
+
+        if last >= skip_to:
+            first = max(first, skip_to)
+
+        self.style_lines(first, last)
+
+    def scrolled(self, updated):
+        """Styles the lines which got into view, but were skipped before"""
+
+        editor = self.editor()
+
+        if editor is None or not updated & QsciScintilla.SC_UPDATE_V_SCROLL:
+            return
+
+        first = self.first_visible_line()
+        last = first + editor.SendScintilla(QsciScintilla.SCI_LINESONSCREEN)
+        last = min(last, editor.lines() - 1)
+        end_styled = editor.SendScintilla(
+            QsciScintilla.SCI_LINEFROMPOSITION, self.end_styled()
+        )
+
+        for line in range(first, min(last, end_styled) + 1):
+            if not editor.SendScintilla(QsciScintilla.SCI_GETLINESTATE, line) & STYLED:
+                self.style_lines(max(line - VISIBLE_MARGIN, 0), last)
+                break
+
+    def first_visible_line(self):
+        editor = self.editor()
+
+        return editor.SendScintilla(
+            QsciScintilla.SCI_DOCLINEFROMVISIBLE,
+            editor.SendScintilla(QsciScintilla.SCI_GETFIRSTVISIBLELINE),
+        )
+
+    def end_styled(self):
+        return self.editor().SendScintilla(QsciScintilla.SCI_GETENDSTYLED)
+
+    def style_lines(self, first, last):
+        """Styles the lines from first to last inclusive"""
+
+        editor = self.editor()
+        send = editor.SendScintilla
+
+        start = send(QsciScintilla.SCI_POSITIONFROMLINE, first)
+        end = send(
+            QsciScintilla.SCI_POSITIONAFTER,
+            send(QsciScintilla.SCI_GETLINEENDPOSITION, last),
+        )
+
+        # The returned bytes have the terminating zero
+        data = bytes(editor.bytes(start, end))[:-1]
+
+        state = 0
+
+        if first > 0:
+            previous = send(QsciScintilla.SCI_GETLINESTATE, first - 1)
+
+            if previous & STYLED:
+                state = previous & ~STYLED
+
+        self.startStyling(start)
+
+        for line, raw in enumerate(data.splitlines(keepends=True), first):
+            content = raw.rstrip(b"\r\n")
+            cut = self.line_limit is not None and len(content) > self.line_limit
+
+            # Only the beginning of a too long line is tokenized, spans don't
+            # continue after it
+            if cut:
+                content = content[: self.line_limit]
+
+            text = content.decode("utf-8", "replace")
+            tokens, state = self.grammar.tokenize(text, state)
+
+            if cut:
+                state = 0
+
+            # Offsets of the tokens are in characters, Scintilla needs bytes
+            if len(text) != len(content):
+                tokens = byte_tokens(text, tokens)
+
+            pos = 0
+
+            for token_start, token_end, style in tokens:
+                # Replaced undecodable bytes may take more bytes than they did
+                token_start = min(token_start, len(content))
+                token_end = min(token_end, len(content))
+
+                if token_start > pos:
+                    self.setStyling(token_start - pos, 0)
+
+                self.setStyling(token_end - token_start, style)
+                pos = token_end
+
+            self.setStyling(len(raw) - pos, 0)
+            send(QsciScintilla.SCI_SETLINESTATE, line, STYLED | state)
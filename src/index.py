@@ -0,0 +1,244 @@
+"""Trigram index narrowing down the files which may contain the searched text.
+
+Every file is indexed as the set of the three-byte sequences of its content
+with ASCII letters lowercased. Only the files having all the trigrams of the
+text may contain it, and just them get searched. The index is kept in SQLite
+and updated incrementally: a file is indexed again only when its modification
+time or size changes"""
+
+import array
+import os
+import re
+import sqlite3
+import zlib
+
+from buffer import detect_encoding
+from search import ASCII_COMPATIBLE_ENCODINGS, BINARY_SAMPLE_SIZE, search_files
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_parse
+
+# The index is kept next to the settings database
+INDEX_FILE = "tetra-index.db"
+
+# Files bigger than that number of bytes aren't indexed and always get searched
+MAX_INDEXED_SIZE = 16 << 20
+
+CREATE_TABLES_QUERY = """
+CREATE TABLE IF NOT EXISTS files (
+    id integer PRIMARY KEY,
+    path string UNIQUE NOT NULL,
+    mtime integer,
+    size integer,
+    trigrams blob
+);
+CREATE TABLE IF NOT EXISTS postings (
+    trigram integer,
+    file integer,
+    PRIMARY KEY (trigram, file)
+) WITHOUT ROWID;
+"""
+
+
+def trigrams(data):
+    """Returns the set of trigrams of the bytes as integers"""
+
+    data = data.lower()
+
+    return {a << 16 | b << 8 | c for a, b, c in set(zip(data, data[1:], data[2:]))}
+
+
+def index_file(path):
+    """Returns (path, mtime, size, trigrams) of the file. Trigrams are None if
+    the file isn't indexed and has to be searched every time and empty for
+    binary files which are never searched"""
+
+    stat = os.stat(path)
+    entry = (path, stat.st_mtime_ns, stat.st_size)
+
+    if stat.st_size > MAX_INDEXED_SIZE:
+        return (*entry, None)
+
+    encoding, _ = detect_encoding(path)
+
+    if encoding not in ASCII_COMPATIBLE_ENCODINGS:
+        return (*entry, None)
+
+    with open(path, mode="rb") as file:
+        data = file.read()
+
+    if b"\0" in data[:BINARY_SAMPLE_SIZE]:
+        return (*entry, set())
+
+    return (*entry, trigrams(data))
+
+
+def index_and_search(paths, *search):
+    """Indexes the files and searches them. Returns the index entries and
+    the results of search_files"""
+
+    entries = []
+
+    for path in paths:
+        try:
+            entries.append(index_file(path))
+        except (OSError, ValueError, LookupError):
+            continue
+
+    return entries, search_files(paths, *search)
+
+
+def required_literals(pattern, regex=False):
+    """Returns the strings every match of the pattern contains. Only the
+    literal parts of the top level of the regular expression are taken"""
+
+    if not regex:
+        return [pattern]
+
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return []
+
+    literals = [[]]
+
+    for op, argument in parsed:
+        if op is sre_parse.LITERAL:
+            literals[-1].append(chr(argument))
+        else:
+            literals.append([])
+
+    return ["".join(literal) for literal in literals]
+
+
+def query_trigrams(pattern, regex=False, case=False):
+    """Returns trigrams every file with a match of the pattern has"""
+
+    found = set()
+
+    for literal in required_literals(pattern, regex):
+        found |= trigrams(literal.encode())
+
+    # Only ASCII letters are lowercased in the index
+    if not case:
+        found = {trigram for trigram in found if not trigram & 0x808080}
+
+    return found
+
+
+def pack(trigrams):
+    return zlib.compress(array.array("I", sorted(trigrams)).tobytes())
+
+
+def unpack(data):
+    return array.array("I", zlib.decompress(data))
+
+
+class TrigramIndex:
+    """Index of the files kept in the database"""
+
+    def __init__(self, path=INDEX_FILE):
+        self.con = sqlite3.connect(path)
+
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript(CREATE_TABLES_QUERY)
+
+    def close(self):
+        self.con.commit()
+        self.con.close()
+
+    def files_under(self, root):
+        """Returns (id, mtime, size) of the indexed files in the directory and
+        all its subdirectories by their paths"""
+
+        prefix = os.path.join(root, "")
+        end = prefix[:-1] + chr(ord(os.sep) + 1)
+
+        return {
+            path: (id, mtime, size)
+            for id, path, mtime, size in self.con.execute(
+                "SELECT id, path, mtime, size FROM files WHERE path >= ? AND path < ?",
+                (prefix, end),
+            )
+        }
+
+    def candidates(self, trigrams):
+        """Returns identifiers of the files which may contain all the trigrams
+        or None if any file may"""
+
+        if not trigrams:
+            return None
+
+        found = None
+
+        for trigram in trigrams:
+            files = {
+                file
+                for (file,) in self.con.execute(
+                    "SELECT file FROM postings WHERE trigram=?", (trigram,)
+                )
+            }
+            found = files if found is None else found & files
+
+            if not found:
+                break
+
+        return found | {
+            id
+            for (id,) in self.con.execute("SELECT id FROM files WHERE trigrams IS NULL")
+        }
+
+    def update(self, path, mtime, size, trigrams):
+        """Indexes the file again replacing its previous trigrams"""
+
+        row = self.con.execute(
+            "SELECT id, trigrams FROM files WHERE path=?", (path,)
+        ).fetchone()
+        data = None if trigrams is None else pack(trigrams)
+
+        if row is None:
+            id = self.con.execute(
+                "INSERT INTO files (path, mtime, size, trigrams) VALUES (?, ?, ?, ?)",
+                (path, mtime, size, data),
+            ).lastrowid
+        else:
+            id, old = row
+            self.drop_postings(id, old)
+            self.con.execute(
+                "UPDATE files SET mtime=?, size=?, trigrams=? WHERE id=?",
+                (mtime, size, data, id),
+            )
+
+        if trigrams:
+            self.con.executemany(
+                "INSERT INTO postings VALUES (?, ?)",
+                ((trigram, id) for trigram in trigrams),
+            )
+
+    def drop_postings(self, id, trigrams):
+        if trigrams is not None:
+            self.con.executemany(
+                "DELETE FROM postings WHERE trigram=? AND file=?",
+                ((trigram, id) for trigram in unpack(trigrams)),
+            )
+
+    def remove(self, paths):
+        """Removes the files from the index"""
+
+        for path in paths:
+            row = self.con.execute(
+                "SELECT id, trigrams FROM files WHERE path=?", (path,)
+            ).fetchone()
+
+            if row is not None:
+                self.drop_postings(*row)
+                self.con.execute("DELETE FROM files WHERE id=?", (row[0],))
+
+    def invalidate(self, path):
+        """Makes the file be indexed again on the next search"""
+
+        with self.con:
+            self.con.execute("UPDATE files SET mtime=-1 WHERE path=?", (path,))
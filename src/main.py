@@ -1,3 +1,4 @@
+import multiprocessing
 import sys
 
 from PyQt5.QtWidgets import QApplication
@@ -6,7 +7,14 @@ from core import Core
 
 
 if __name__ == "__main__":
+    # Searching in files runs in worker processes
+    multiprocessing.freeze_support()
+
     app = QApplication(sys.argv)
     editor = Core()
     editor.show()
+
+    if len(sys.argv) > 1:
+        editor.open_paths(sys.argv[1:])
+
     sys.exit(app.exec_())
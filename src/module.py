@@ -1,17 +1,23 @@
 from copy import deepcopy
+from modules import describe
 
 
 class Module:
     """A program module or, in other words, configurable component of the
     program with minimal additional functionality"""
 
-    def __init__(self, name, description, default_settings, core, can_disable=True):
+    def __init__(
+        self, name, description, default_settings, core, can_disable=True, events=()
+    ):
         self.name = name
         self.description = description
         self.default_settings = default_settings
         self.core = core
         self.can_disable = can_disable
 
+        # Events after which the module gets refreshed
+        self.events = frozenset(events)
+
         self.id = self.__module__.split(".")[-1]
         self.settings = deepcopy(default_settings)
 
@@ -30,6 +36,16 @@ class Module:
         """Returns the settings with the provided identifier"""
         return self.settings[setting_id]
 
+    def changed_settings(self, changes):
+        """Returns identifiers of the module settings present in the change set
+        of the SETTINGS_SAVED event. Without the change set all the settings
+        are considered changed"""
+
+        if changes is None:
+            return set(self.settings)
+
+        return changes.get(self.id, set())
+
     def is_loaded(self):
         """Returns the state of the module (whether it's loaded into the program)"""
         return self.loaded
@@ -63,18 +79,56 @@ class Module:
     def load(self):
         """Loads the module into the program"""
         self.loaded = True
+        self.core.subscribe(self)
 
     __load = load
 
     def unload(self):
         """Unloads the module into the program"""
         self.loaded = False
+        self.core.unsubscribe(self)
 
     __unload = unload
 
-    def refresh(self):
-        """Refreshes the module. It's useful to call that method after an event
-        raise to refresh the state of the module according to that event"""
+    def refresh(self, event=None, payload=None):
+        """Refreshes the module. The core calls that method after the raise of
+        every event the module is subscribed to, passing the event payload"""
         pass
 
     __refresh = refresh
+
+
+class ModuleStub:
+    """A placeholder of the module which was disabled on startup and therefore
+    wasn't imported. Enabling it imports the real module and puts it in place
+    of the placeholder"""
+
+    def __init__(self, id, core):
+        self.id = id
+        self.core = core
+        self.name, self.description = describe(id)
+        self.default_settings = {}
+        self.settings = {}
+        self.events = frozenset()
+        self.can_disable = True
+        self.enabled = False
+        self.loaded = False
+
+    def is_loaded(self):
+        return False
+
+    def toggle(self, state):
+        if state:
+            self.enable()
+
+    def enable(self):
+        self.core.enable_module(self.id)
+
+    def disable(self):
+        pass
+
+    def unload(self):
+        pass
+
+    def save_settings(self):
+        pass
@@ -1,14 +1,66 @@
-import os, sys
+"""Registry of the editor modules. Modules are discovered without importing
+them, so that the disabled ones are never imported"""
+
+import ast, os, pkgutil, sys
 
 sys.path.append(os.path.dirname(__file__))
 
-del os, sys
+# Modules get loaded in that order, other discovered modules go after them
+LOAD_ORDER = [
+    "database",
+    "appearance",
+    "menu",
+    "edit_buffer",
+    "tabbar",
+    "statusbar",
+    "session",
+    "hibernation",
+    "watcher",
+    "find_in_files",
+    "quick_open",
+    "outline",
+]
+
+
+def discover():
+    """Returns identifiers of all the available modules in the load order"""
+
+    found = sorted(
+        module.name
+        for module in pkgutil.iter_modules(__path__)
+        if module.ispkg and not module.name.startswith("__")
+    )
+
+    return [id for id in LOAD_ORDER if id in found] + [
+        id for id in found if id not in LOAD_ORDER
+    ]
+
+
+def describe(id):
+    """Returns name and description of the module reading them from its
+    source without importing it"""
+
+    values = {"NAME": id.replace("_", " ").capitalize(), "DESCRIPTION": ""}
+
+    try:
+        with open(os.path.join(os.path.dirname(__file__), id, "__init__.py")) as file:
+            tree = ast.parse(file.read())
+    except (OSError, SyntaxError):
+        return values["NAME"], values["DESCRIPTION"]
+
+    for node in tree.body:
+        if (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+            and node.targets[0].id in values
+        ):
+            try:
+                values[node.targets[0].id] = ast.literal_eval(node.value)
+            except ValueError:
+                pass
+
+    return values["NAME"], values["DESCRIPTION"]
 
-import database
-import appearance
-import menu
-import edit_buffer
-import tabbar
-import statusbar
 
-MODULES = list(filter(lambda m: not m.startswith("__"), globals().keys()))
+MODULES = discover()
@@ -17,7 +17,14 @@ DEFAULT_SETTINGS = {
 
 class Appearance(Module):
     def __init__(self, core):
-        super().__init__(NAME, DESCRIPTION, DEFAULT_SETTINGS, core, can_disable=False)
+        super().__init__(
+            NAME,
+            DESCRIPTION,
+            DEFAULT_SETTINGS,
+            core,
+            can_disable=False,
+            events=(Event.SETTINGS_SAVED,),
+        )
 
     def load_theme(self):
         try:
@@ -39,11 +46,11 @@ class Appearance(Module):
 
         self.core.setStyleSheet("")
 
-    def refresh(self):
-        super().refresh()
+    def refresh(self, event=None, payload=None):
+        super().refresh(event, payload)
 
         if (
-            self.core.last_event() == Event.SETTINGS_SAVED
+            event == Event.SETTINGS_SAVED
             and (new_theme_file := self["theme_file"].get_value()) != self.theme_file
         ):
             self.theme_file = new_theme_file
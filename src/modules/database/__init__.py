@@ -1,7 +1,10 @@
+from buffer import Buffer, NoSyncFileError
 from module import Module
 from setting import *
+from worker import SettingsWriter
 from copy import deepcopy
 
+import os
 import sqlite3
 
 NAME = "Database"
@@ -21,6 +24,17 @@ CREATE TABLE IF NOT EXISTS settings (
     module string,
     value string
 );
+CREATE TABLE IF NOT EXISTS session (
+    id integer PRIMARY KEY,
+    data blob
+);
+CREATE TABLE IF NOT EXISTS encodings (
+    path string PRIMARY KEY,
+    size integer,
+    mtime integer,
+    encoding string,
+    confirmed boolean
+);
 """
 
 
@@ -28,59 +42,73 @@ class Database(Module):
     def __init__(self, core):
         super().__init__(NAME, DESCRIPTION, DEFAULT_SETTINGS, core, can_disable=False)
 
+        self.writer = None
+
     def connect(self):
         self.con = sqlite3.connect(DB_FILE)
 
+        # Write-ahead log makes commits cheaper and doesn't block readers
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+
     def create_tables(self):
         """Creates needed tables if they aren't"""
 
         self.con.executescript(CREATE_TABLES_QUERY)
 
+    def preload(self):
+        """Reads states of all the modules and values of all the settings at
+        once instead of querying them for every module"""
+
+        self.enabled_states = dict(self.con.execute("SELECT id, enabled FROM modules"))
+        self.setting_values = dict(self.con.execute("SELECT id, value FROM settings"))
+
     def inject_features(self):
         """Injects db functionality into the program"""
 
+        core = self.core
         con = self.con
         cur = self.con.cursor()
+        enabled_states = self.enabled_states
+        setting_values = self.setting_values
 
         def module_init(mod, *args, **kwargs):
             Module._Module__init(mod, *args, **kwargs)
 
-            cur.execute(
-                "INSERT OR IGNORE INTO modules VALUES (?,?)", (mod.id, mod.enabled)
-            )
-
-            mod.enabled = bool(
+            if mod.id not in enabled_states:
+                enabled_states[mod.id] = mod.enabled
                 cur.execute(
-                    "SELECT enabled FROM modules WHERE id=?", (mod.id,)
-                ).fetchone()[0]
-            )
+                    "INSERT OR IGNORE INTO modules VALUES (?,?)", (mod.id, mod.enabled)
+                )
+
+            mod.enabled = bool(enabled_states[mod.id])
+
+            missing_rows = []
 
             for setting_id, setting in mod.default_settings.items():
-                id, module, value = f"{mod.id}:{setting_id}", mod.id, setting.value
-                cur.execute(
-                    "INSERT OR IGNORE INTO settings VALUES (?,?,?)", (id, module, value)
-                )
+                id = f"{mod.id}:{setting_id}"
 
-            def row_to_setting(row):
-                id, value = row
-                id = id.split(":")[-1]
-                setting = deepcopy(mod.default_settings[id])
-                setting.value = value
+                if id not in setting_values:
+                    setting_values[id] = setting.value
+                    missing_rows.append((id, mod.id, setting.value))
 
-                return id, setting
+            cur.executemany(
+                "INSERT OR IGNORE INTO settings VALUES (?,?,?)", missing_rows
+            )
 
-            setting_rows = cur.execute(
-                "SELECT id,value FROM settings WHERE module IN (SELECT id FROM modules WHERE id=?)",
-                (mod.id,),
-            ).fetchall()
+            mod.settings = {}
 
-            mod.settings = {
-                id: setting for id, setting in map(row_to_setting, setting_rows)
-            }
+            for id, default in mod.default_settings.items():
+                setting = deepcopy(default)
+                setting.value = setting_values[f"{mod.id}:{id}"]
+                mod.settings[id] = setting
 
-            con.commit()
+            # Something is written only on the first start of the module
+            if con.in_transaction:
+                con.commit()
 
         def update_enabled_state(mod, state):
+            enabled_states[mod.id] = state
             cur.execute("UPDATE modules SET enabled=? WHERE id=?", (state, mod.id))
             con.commit()
 
@@ -92,21 +120,120 @@ class Database(Module):
             Module._Module__disable(mod, *args, **kwargs)
             update_enabled_state(mod, False)
 
+        def core_flush_settings(wait=False):
+            """Writes all the changed settings in a single transaction"""
+
+            core.settings_timer.stop()
+
+            dirty = core.setting_store.take_dirty()
+            setting_values.update(dirty)
+
+            # Writes must not race with each other
+            if self.writer is not None:
+                self.writer.wait()
+
+            rows = [(value, id) for id, value in dirty.items()]
+
+            if not rows:
+                return
+
+            if wait:
+                with con:
+                    cur.executemany("UPDATE settings SET value=? WHERE id=?", rows)
+                return
+
+            writer = self.writer = SettingsWriter(DB_FILE, rows)
+
+            def finish():
+                if self.writer is writer:
+                    self.writer = None
+
+                # Failed rows are written next time unless changed meanwhile
+                if writer.error is not None:
+                    for value, id in rows:
+                        core.setting_store.dirty.setdefault(id, value)
+
+            writer.finished.connect(finish)
+            writer.start()
+
         def module_save_settings(mod):
             """Сохраняет настройки модуля в базу данных"""
-            for id, setting in mod.settings.items():
-                cur.execute(
-                    "UPDATE settings SET value=? WHERE id=?",
-                    (setting.value, f"{mod.id}:{id}"),
-                )
-                con.commit()
+            core.save_settings((mod,))
+
+        def buffer_determine_encoding(buf):
+            """Returns the encoding remembered for the sync file if it wasn't
+            changed since then, otherwise determines and remembers it"""
+
+            if buf.file is None:
+                raise NoSyncFileError
+
+            path = os.path.abspath(buf.file)
+            stat = os.stat(path)
+
+            row = cur.execute(
+                "SELECT size, mtime, encoding, confirmed FROM encodings WHERE path=?",
+                (path,),
+            ).fetchone()
+
+            if row is not None and tuple(row[:2]) == (stat.st_size, stat.st_mtime_ns):
+                return row[2], bool(row[3])
+
+            encoding, confirmed = Buffer._Buffer__determine_encoding(buf)
+
+            cur.execute(
+                "INSERT OR REPLACE INTO encodings VALUES (?,?,?,?,?)",
+                (path, stat.st_size, stat.st_mtime_ns, encoding, confirmed),
+            )
+            con.commit()
+
+            return encoding, confirmed
+
+        # Paths which aren't valid UTF-8 can't be stored, their encodings
+        # aren't remembered
+
+        def core_cached_encodings(paths):
+            cached = {}
+
+            for path in paths:
+                try:
+                    row = cur.execute(
+                        "SELECT size, mtime, encoding, confirmed FROM encodings WHERE path=?",
+                        (os.path.abspath(path),),
+                    ).fetchone()
+                except UnicodeEncodeError:
+                    continue
+
+                if row is not None:
+                    cached[path] = (row[0], row[1], row[2], bool(row[3]))
+
+            return cached
+
+        def core_remember_encodings(rows):
+            for path, *rest in rows:
+                try:
+                    cur.execute(
+                        "INSERT OR REPLACE INTO encodings VALUES (?,?,?,?,?)",
+                        (os.path.abspath(path), *rest),
+                    )
+                except UnicodeEncodeError:
+                    continue
+
+            con.commit()
+
+        def core_module_enabled(id):
+            return bool(enabled_states.get(id, True))
 
         Module.__init__ = module_init
         Module.enable = module_enable
         Module.disable = module_disable
         Module.save_settings = module_save_settings
+        Buffer.determine_encoding = buffer_determine_encoding
 
         self.core.con = self.con
+        self.core.module_enabled = core_module_enabled
+        self.core.flush_settings = core_flush_settings
+        self.core.cached_encodings = core_cached_encodings
+        self.core.remember_encodings = core_remember_encodings
 
     def disconnect(self):
         self.core.con.close()
@@ -117,20 +244,27 @@ class Database(Module):
         Module.__init__ = Module._Module__init
         Module.enable = Module._Module__enable
         Module.disable = Module._Module__disable
+        Buffer.determine_encoding = Buffer._Buffer__determine_encoding
 
         del Module.save_settings
 
         del self.core.con
+        self.core.module_enabled = self.core._Core__module_enabled
+        self.core.flush_settings = self.core._Core__flush_settings
+        self.core.cached_encodings = self.core._Core__cached_encodings
+        self.core.remember_encodings = self.core._Core__remember_encodings
 
     def load(self):
         super().load()
 
         self.connect()
         self.create_tables()
+        self.preload()
         self.inject_features()
 
     def unload(self):
         super().unload()
 
+        self.core.flush_settings(wait=True)
         self.disconnect()
         self.eject_features()
@@ -2,17 +2,110 @@ from typing import OrderedDict
 from buffer import GuiBuffer
 from utils import FileType
 from module import Module
-from PyQt5.Qsci import *
+from PyQt5 import Qsci
+from PyQt5.Qsci import QsciScintilla
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QColor, QKeySequence
+from PyQt5.QtWidgets import (
+    QAction,
+    QApplication,
+    QCheckBox,
+    QGridLayout,
+    QLabel,
+    QLineEdit,
+    QPushButton,
+    QWidget,
+)
 from event import Event
+from highlighter import Grammar, Highlighter, find_grammar
 from setting import *
 
+import os
+import re
+import time
 
 NAME = "Editing buffer"
 DESCRIPTION = "File editing goes there"
 
+TRIGGER_EVENTS = (
+    Event.NEW_BUFFER_CREATED,
+    Event.FILE_OPENED,
+    Event.FILE_SAVED_AS,
+    Event.SETTING_CHANGED,
+    Event.SETTINGS_SAVED,
+    Event.TAB_CHANGED,
+    Event.BUFFER_TEXT_CHANGED,
+    Event.FILE_RELOADED,
+)
+
 EOL_UNIX = "Unix (LF)"
 EOL_WINDOWS = "Windows (CR LF)"
 
+# Number of bytes from the beginning of a file looked at to find too long lines
+LINE_LENGTH_SAMPLE_SIZE = 1 << 20
+
+# Names of the lexer classes by file types. Lexers are looked up on the first
+# use only
+LEXERS = {
+    FileType.PYTHON: "QsciLexerPython",
+    FileType.JSON: "QsciLexerJSON",
+    FileType.SQL: "QsciLexerSQL",
+    FileType.XML: "QsciLexerXML",
+    FileType.HTML: "QsciLexerHTML",
+    FileType.YAML: "QsciLexerYAML",
+    FileType.MARKDOWN: "QsciLexerMarkdown",
+}
+
+
+class LexerPool:
+    """Lexers shared by all the buffers, one per file type. A lexer is created
+    and configured on the first use only and lives as long as the parent"""
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.lexers = {}
+
+    def get(self, file_type):
+        try:
+            return self.lexers[file_type]
+        except KeyError:
+            pass
+
+        lexer = self.lexers[file_type] = getattr(Qsci, LEXERS[file_type])(self.parent)
+
+        return lexer
+
+
+# Number of bytes of the document searched at once. Chunks are extended to the
+# end of the line
+SEARCH_CHUNK_SIZE = 256 << 10
+
+# Number of bytes after a chunk searched for the matches starting in it, so
+# matches crossing the borders of the chunks are found unless they are longer
+# than that
+SEARCH_OVERLAP = 64 << 10
+
+# Time in seconds matches are counted for before letting other events through
+COUNT_TIME_SLICE = 0.008
+
+# Maximum number of matches highlighted in the visible part of the document
+MAX_HIGHLIGHTS = 1000
+
+# Time in milliseconds after the last text change before the highlights and the
+# number of matches are refreshed
+FIND_REFRESH_DELAY = 100
+
+# Scintilla indicator drawing the highlights of the matches
+FIND_INDICATOR = QsciScintilla.INDIC_CONTAINER
+
+# Values of the settings forced in the large file mode
+LARGE_FILE_SETTINGS = {
+    "wrap_mode": QsciScintilla.WrapNone,
+    "eol_visibility": False,
+    "indentation_guides": False,
+    "caret_line_visible": False,
+}
+
 DEFAULT_SETTINGS = {
     "syntax_highlighting": BoolSetting(
         name="Syntax highlighting",
@@ -98,22 +191,62 @@ DEFAULT_SETTINGS = {
         description="Cursor width in pixels. A zero one makes the cursor invisible!",
         value=1,
     ),
+    "fsync_on_save": BoolSetting(
+        name="Flush saved files to disk",
+        description="Waits until the saved file is physically written to the disk before replacing the original one. It's safer in case of a power loss, but slower",
+        value=False,
+    ),
+    "large_file_size": IntSetting(
+        name="Large file size",
+        description="Files bigger than that number of megabytes are opened in the large file mode. In that mode syntax highlighting, wrapping, indentation guides, EOL indicators and current line highlighting are turned off",
+        value=10,
+        min_value=1,
+    ),
+    "large_file_line_length": IntSetting(
+        name="Large file line length",
+        description="Files having lines longer than that number of characters are opened in the large file mode too",
+        value=5000,
+        min_value=1,
+        max_value=1000000,
+    ),
 }
 
 
 class EnhancedGuiBuffer(QsciScintilla, GuiBuffer):
     """Enhanced graphical text-editing buffer"""
 
-    def __init__(self, settings, buffer=None):
+    def __init__(self, settings, buffer=None, lexers=None):
         super().__init__()
 
         self.buffer = buffer
+        self.lexers = LexerPool(self) if lexers is None else lexers
+
+        # Grammar or file type the current lexer was set for
+        self.highlighting = None
+
+        # Whether the opened file exceeds the large file thresholds and whether
+        # the costly features are actually turned off for it
+        self.large_file_detected = False
+        self.large_file = False
+
+        # Number of the setting changes of the module applied to the buffer
+        self.settings_revision = 0
+
         self.apply_settings(settings)
 
-    def apply_settings(self, settings):
-        if self.buffer is not None and settings["syntax_highlighting"].get_value():
+    def apply_settings(self, settings, ids=None):
+        """Applies the settings with the passed identifiers, all of them if
+        identifiers aren't passed"""
+
+        if (
+            self.buffer is not None
+            and (ids is None or "syntax_highlighting" in ids)
+            and settings["syntax_highlighting"].get_value()
+        ):
             self.apply_syntax_highlighting()
 
+        overrides = LARGE_FILE_SETTINGS if self.large_file else {}
+
         assignments = {
             "line_numbers": self.apply_line_numbers,
             "wrap_mode": self.setWrapMode,
@@ -131,10 +264,38 @@ class EnhancedGuiBuffer(QsciScintilla, GuiBuffer):
         }
 
         for id, activator in assignments.items():
-            activator(settings[id].get_value())
+            if ids is not None and id not in ids:
+                continue
+
+            activator(overrides[id] if id in overrides else settings[id].get_value())
 
         self.settings = settings
 
+    def set_large_file_mode(self, yes):
+        """Turns the costly editing features off if yes, otherwise turns them
+        back on according to the settings"""
+
+        self.large_file = yes
+        lexer = self.lexer()
+
+        if isinstance(lexer, Highlighter):
+            lexer.line_limit = self.styled_line_limit()
+            self.recolor()
+        elif yes:
+            self.set_lexer(None)
+
+        self.apply_settings(self.settings)
+
+    def styled_line_limit(self):
+        """Returns the number of bytes the highlighter styles in every line.
+        Restyling a whole minified file after every keystroke takes seconds, so
+        only the beginning of long lines gets styled in the large file mode"""
+
+        if not self.large_file:
+            return None
+
+        return self.settings["large_file_line_length"].get_value()
+
     def apply_line_numbers(self, yes):
         if not yes:
             self.setMarginWidth(1, 0)
@@ -147,22 +308,42 @@ class EnhancedGuiBuffer(QsciScintilla, GuiBuffer):
         if self.buffer is None:
             return
 
-        file_type = self.buffer.file_type()
+        # Grammars style the visible lines only and the beginnings of long
+        # lines, which is cheap enough even for large files
+        highlighting = find_grammar(self.buffer.file)
 
-        lexers = {
-            FileType.PYTHON: QsciLexerPython,
-            FileType.JSON: QsciLexerJSON,
-            FileType.SQL: QsciLexerSQL,
-            FileType.XML: QsciLexerXML,
-            FileType.HTML: QsciLexerHTML,
-            FileType.YAML: QsciLexerYAML,
-            FileType.MARKDOWN: QsciLexerMarkdown,
-        }
+        if highlighting is None:
+            if self.large_file:
+                return
 
-        if file_type not in lexers:
+            highlighting = self.buffer.file_type()
+
+        # The document is highlighted already
+        if highlighting == self.highlighting and self.lexer() is not None:
             return
 
-        self.setLexer(lexers[file_type](self))
+        self.set_lexer(highlighting)
+
+    def set_lexer(self, highlighting):
+        """Sets the highlighter of the grammar or the shared lexer of the file
+        type, removes the lexer if there's neither"""
+
+        previous = self.lexer()
+
+        if isinstance(highlighting, Grammar):
+            lexer = Highlighter(highlighting, self)
+            lexer.line_limit = self.styled_line_limit()
+        elif highlighting in LEXERS:
+            lexer = self.lexers.get(highlighting)
+        else:
+            highlighting = lexer = None
+
+        self.highlighting = highlighting
+        self.setLexer(lexer)
+
+        # Unlike the shared lexers highlighters belong to the buffer
+        if isinstance(previous, Highlighter):
+            previous.deleteLater()
 
     def text_changed(self, func):
         self.textChanged.connect(func)
@@ -176,43 +357,811 @@ class EnhancedGuiBuffer(QsciScintilla, GuiBuffer):
     def get_text(self):
         return self.text()
 
-    def refresh(self, settings, event, buffer=None):
-        if (
-            event in {Event.SETTING_CHANGED, Event.SETTINGS_SAVED}
-            or self.settings != settings
-        ):
-            self.apply_settings(settings)
+    def text_length(self):
+        return self.length()
+
+    def append_text(self, text):
+        self.append(text)
+
+    def get_position(self):
+        line, index = self.getCursorPosition()
+        return line, index, self.firstVisibleLine()
+
+    def set_position(self, position):
+        if position is None:
+            return
+
+        line, index, first_visible_line = position
+
+        self.setCursorPosition(line, index)
+        self.setFirstVisibleLine(first_visible_line)
+
+    def begin_loading(self):
+        self.setReadOnly(True)
+        self.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, False)
+
+        # Handling of modification notifications costs time proportional to
+        # the position of a change, which makes appending to the end of the
+        # document quadratic
+        self.mod_event_mask = self.SendScintilla(QsciScintilla.SCI_GETMODEVENTMASK)
+        self.SendScintilla(QsciScintilla.SCI_SETMODEVENTMASK, 0)
+
+    def end_loading(self):
+        self.SendScintilla(QsciScintilla.SCI_SETMODEVENTMASK, self.mod_event_mask)
+        self.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, True)
+        self.SendScintilla(QsciScintilla.SCI_EMPTYUNDOBUFFER)
+        self.setReadOnly(False)
+
+    def refresh(self, settings, event, buffer=None, changed=()):
+        """Refreshes the buffer after the event applying the changed settings"""
 
         if self.buffer is not buffer:
             self.buffer = buffer
 
+        if event == Event.FILE_OPENED and self.large_file_detected:
+            self.set_large_file_mode(True)
+        elif changed:
+            self.apply_settings(settings, changed)
+
         if event in {Event.FILE_OPENED, Event.FILE_SAVED_AS}:
             self.apply_syntax_highlighting()
 
 
+def compile_search(pattern, regex=False, case=False):
+    """Returns the regular expression searching for the pattern in the text
+    of a document"""
+
+    source = pattern if regex else re.escape(pattern)
+    flags = 0 if case else re.IGNORECASE
+
+    return re.compile(source, flags | re.MULTILINE)
+
+
+def next_line_start(view, position, end):
+    """Returns the start of the line after the one of the position, but not
+    after the end"""
+
+    line = view.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, position)
+    start = view.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, line + 1)
+
+    return end if start == -1 or start > end else start
+
+
+def chunk_bounds(view, start, end):
+    """Yields (start, end) ranges of the document between the positions
+    about SEARCH_CHUNK_SIZE bytes long each"""
+
+    while start < end:
+        stop = start + SEARCH_CHUNK_SIZE
+        stop = next_line_start(view, stop, end) if stop < end else end
+
+        yield start, stop
+        start = stop
+
+
+def document_bytes(view, start, end):
+    # Scintilla adds the terminating zero byte
+    return bytes(view.bytes(start, end))[: end - start]
+
+
+def encode_text(text):
+    return text.encode("utf-8", "surrogateescape")
+
+
+def document_text(view, start, end):
+    """Returns the text of the document between the positions. Bytes which
+    aren't valid UTF-8 are kept as surrogates, so the text is encoded back to
+    the same bytes"""
+
+    return document_bytes(view, start, end).decode("utf-8", "surrogateescape")
+
+
+class SearchWindow:
+    """Text of a part of the document searched at once. Positions of
+    Scintilla are in bytes of the UTF-8 text, so indices of the characters
+    get converted to them"""
+
+    def __init__(self, view, start, end):
+        self.start = start
+        self.data = document_bytes(view, start, end)
+        self.text = self.data.decode("utf-8", "surrogateescape")
+
+        # Indices in ASCII text are the same as the positions
+        self.ascii = self.text.isascii()
+
+        # Last converted index and its position
+        self.index = 0
+        self.position = start
+
+    def position_of(self, index):
+        """Returns the position of the character at the index. Only the text
+        after the last converted index is encoded for the growing indices"""
+
+        if self.ascii:
+            return self.start + index
+
+        if index < self.index:
+            self.index, self.position = 0, self.start
+
+        self.position += len(encode_text(self.text[self.index : index]))
+        self.index = index
+
+        return self.position
+
+    def index_of(self, position):
+        """Returns the index of the character at the position"""
+
+        if self.ascii:
+            return position - self.start
+
+        return len(
+            self.data[: position - self.start].decode("utf-8", "surrogateescape")
+        )
+
+
+def chunk_matches(view, regex, chunk, end, resume):
+    """Yields (window, match) pairs of the matches of the regular expression
+    starting in the chunk at the resume position or after it. The window
+    holds the chunk together with SEARCH_OVERLAP bytes after it, but not after
+    the end"""
+
+    start, stop = chunk
+    window_end = stop + SEARCH_OVERLAP
+    window_end = next_line_start(view, window_end, end) if window_end < end else end
+
+    window = SearchWindow(view, start, window_end)
+
+    # Empty matches may be at the very end
+    limit = window.index_of(stop) if stop < end else len(window.text) + 1
+
+    for match in regex.finditer(window.text, window.index_of(max(resume, start))):
+        if match.start() >= limit:
+            break
+
+        yield window, match
+
+
+def find_matches(view, regex, start, end):
+    """Yields (start, end) positions of the matches of the regular
+    expression in the document between the positions"""
+
+    resume = start
+
+    for chunk in chunk_bounds(view, start, end):
+        for window, match in chunk_matches(view, regex, chunk, end, resume):
+            found = window.position_of(match.start())
+            resume = window.position_of(match.end())
+            yield found, resume
+
+
+def find_last(view, regex, start, end, skipped=None):
+    """Returns positions of the last match between the positions other than
+    the skipped one or None. Chunks are searched from the end"""
+
+    for chunk in reversed(list(chunk_bounds(view, start, end))):
+        found = None
+
+        for window, match in chunk_matches(view, regex, chunk, end, chunk[0]):
+            bounds = window.position_of(match.start()), window.position_of(match.end())
+
+            if bounds != skipped:
+                found = bounds
+
+        if found is not None:
+            return found
+
+    return None
+
+
+class FindBar(QWidget):
+    """Bar searching for text in the current buffer as it's typed and
+    replacing it. Only the visible matches are highlighted, the matches of the
+    whole document are counted chunk by chunk between the other events"""
+
+    def __init__(self, core):
+        super().__init__()
+
+        self.core = core
+
+        # Compiled pattern or None if there's nothing to find
+        self.regex = None
+
+        # Position where typing of the pattern started to find it from
+        self.anchor = 0
+
+        # View whose matches are highlighted
+        self.highlighted = None
+
+        # Ranges of the document left to count matches in, the end of the
+        # document, the position counting continues from and the number of
+        # the matches
+        self.counting = None
+        self.counted_end = 0
+        self.resume = 0
+        self.count = 0
+
+        self.pattern = QLineEdit()
+        self.pattern.setPlaceholderText("Find")
+        self.replacement = QLineEdit()
+        self.replacement.setPlaceholderText("Replace")
+
+        self.regex_box = QCheckBox("Regular expression")
+        self.case_box = QCheckBox("Match case")
+
+        self.previous_button = QPushButton("Previous")
+        self.next_button = QPushButton("Next")
+        self.replace_button = QPushButton("Replace")
+        self.replace_all_button = QPushButton("Replace all")
+
+        self.status = QLabel()
+
+        self.main_layout = QGridLayout()
+        self.main_layout.setContentsMargins(0, 0, 0, 0)
+        self.main_layout.addWidget(self.pattern, 0, 0)
+        self.main_layout.addWidget(self.previous_button, 0, 1)
+        self.main_layout.addWidget(self.next_button, 0, 2)
+        self.main_layout.addWidget(self.regex_box, 0, 3)
+        self.main_layout.addWidget(self.case_box, 0, 4)
+        self.main_layout.addWidget(self.replacement, 1, 0)
+        self.main_layout.addWidget(self.replace_button, 1, 1)
+        self.main_layout.addWidget(self.replace_all_button, 1, 2)
+        self.main_layout.addWidget(self.status, 1, 3, 1, 2)
+        self.setLayout(self.main_layout)
+
+        self.pattern.textEdited.connect(self.find_incrementally)
+        self.pattern.returnPressed.connect(self.find_from_keyboard)
+        self.replacement.returnPressed.connect(self.replace)
+        self.regex_box.toggled.connect(self.find_incrementally)
+        self.case_box.toggled.connect(self.find_incrementally)
+        self.previous_button.clicked.connect(self.find_previous)
+        self.next_button.clicked.connect(self.find_next)
+        self.replace_button.clicked.connect(self.replace)
+        self.replace_all_button.clicked.connect(self.replace_all)
+
+        self.highlight_timer = QTimer(self)
+        self.highlight_timer.setSingleShot(True)
+        self.highlight_timer.timeout.connect(self.highlight)
+
+        self.count_timer = QTimer(self)
+        self.count_timer.setSingleShot(True)
+        self.count_timer.timeout.connect(self.count_matches)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.timeout.connect(self.refresh_matches)
+
+        self.hide()
+
+    def view(self):
+        """Returns the editing buffer of the current tab or None if it can't
+        be searched"""
+
+        try:
+            view = self.core.buffers.current().view
+        except (AttributeError, KeyError):
+            return None
+
+        return view if isinstance(view, QsciScintilla) else None
+
+    def open(self, replacing=False):
+        """Shows the bar with the selected text as the pattern"""
+
+        view = self.view()
+
+        if view is not None:
+            selected = view.selectedText()
+
+            if selected and "\n" not in selected:
+                self.pattern.setText(selected)
+
+            self.anchor = view.SendScintilla(QsciScintilla.SCI_GETSELECTIONSTART)
+
+        self.show()
+
+        field = self.replacement if replacing and self.pattern.text() else self.pattern
+        field.setFocus()
+        field.selectAll()
+
+        self.compile()
+        self.refresh_matches()
+
+    def dismiss(self):
+        self.hide()
+        self.regex = None
+        self.refresh_matches()
+
+        view = self.view()
+
+        if view is not None:
+            view.setFocus()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Escape:
+            self.dismiss()
+        else:
+            super().keyPressEvent(event)
+
+    def compile(self):
+        """Compiles the pattern, returns whether it's valid"""
+
+        self.regex = None
+        pattern = self.pattern.text()
+
+        if not pattern:
+            self.status.clear()
+            return True
+
+        try:
+            self.regex = compile_search(
+                pattern, self.regex_box.isChecked(), self.case_box.isChecked()
+            )
+        except re.error as error:
+            self.status.setText(f"Invalid regular expression: {error}")
+            return False
+
+        return True
+
+    def find_incrementally(self):
+        """Selects the first match after the position typing started at"""
+
+        valid = self.compile()
+        self.refresh_matches()
+
+        view = self.view()
+
+        if view is None or self.regex is None:
+            self.mark_found(valid)
+            return
+
+        self.mark_found(self.select(self.find_forward(view, self.anchor)))
+
+    def find_from_keyboard(self):
+        if QApplication.keyboardModifiers() & Qt.ShiftModifier:
+            self.find_previous()
+        else:
+            self.find_next()
+
+    def find_next(self):
+        view = self.view()
+
+        if view is None or self.regex is None:
+            return
+
+        start = view.SendScintilla(QsciScintilla.SCI_GETSELECTIONEND)
+        found = self.find_forward(view, start, self.empty_selection(view))
+
+        self.mark_found(self.select(found))
+
+    def find_previous(self):
+        view = self.view()
+
+        if view is None or self.regex is None:
+            return
+
+        end = view.SendScintilla(QsciScintilla.SCI_GETSELECTIONSTART)
+        skipped = self.empty_selection(view)
+        found = find_last(view, self.regex, 0, end, skipped) or find_last(
+            view, self.regex, end, view.length(), skipped
+        )
+
+        self.mark_found(self.select(found))
+
+    def find_forward(self, view, start, skipped=None):
+        """Returns the first match after the position other than the skipped
+        one wrapping around the end of the document or None"""
+
+        for bounds in ((start, view.length()), (0, start)):
+            for found in find_matches(view, self.regex, *bounds):
+                if found != skipped:
+                    return found
+
+        return None
+
+    def empty_selection(self, view):
+        """Returns (start, end) of the selection if it's empty. Empty matches
+        are selected that way, and they are skipped when looking for the next
+        one"""
+
+        start = view.SendScintilla(QsciScintilla.SCI_GETSELECTIONSTART)
+        end = view.SendScintilla(QsciScintilla.SCI_GETSELECTIONEND)
+
+        return (start, end) if start == end else None
+
+    def select(self, found):
+        """Selects the found match scrolling it into view, returns whether
+        there's a match"""
+
+        if found is None:
+            return False
+
+        view = self.view()
+        view.SendScintilla(QsciScintilla.SCI_SETSEL, *found)
+        self.anchor = found[0]
+
+        return True
+
+    def mark_found(self, found):
+        self.pattern.setStyleSheet("" if found else "background-color: #ffc0c0")
+
+    def selected_match(self, view):
+        """Returns the match of the pattern in the selection or None"""
+
+        start = view.SendScintilla(QsciScintilla.SCI_GETSELECTIONSTART)
+        end = view.SendScintilla(QsciScintilla.SCI_GETSELECTIONEND)
+
+        if start == end:
+            return None
+
+        return self.regex.fullmatch(document_text(view, start, end))
+
+    def template(self):
+        """Returns the replacement as the template of re.sub. Groups may be
+        referred to in regular expression mode only"""
+
+        replacement = self.replacement.text()
+
+        if self.regex_box.isChecked():
+            return replacement
+
+        return replacement.replace("\\", "\\\\")
+
+    def substitute(self, matches, template, whole):
+        """Returns the text of the window from the first of the matches to the
+        last one with the matches replaced. If the window is searched from its
+        start, re.subn replaces them at once, since it parses the template
+        only once. Otherwise the matches are replaced one by one"""
+
+        text = matches[0].string
+        head = matches[0].start()
+        tail = matches[-1].end()
+
+        if whole:
+            replaced, count = self.regex.subn(template, text[:tail], len(matches))
+
+            # Text after the last match may change the matches
+            if count == len(matches):
+                return replaced[head:]
+
+        pieces = []
+        index = head
+
+        for match in matches:
+            pieces.append(text[index : match.start()])
+            pieces.append(match.expand(template))
+            index = match.end()
+
+        return "".join(pieces)
+
+    def replace(self):
+        """Replaces the selected match and selects the next one"""
+
+        view = self.view()
+
+        if view is None or self.regex is None or view.isReadOnly():
+            return
+
+        match = self.selected_match(view)
+
+        if match is not None:
+            try:
+                replacement = encode_text(match.expand(self.template()))
+            except re.error as error:
+                self.status.setText(f"Invalid replacement: {error}")
+                return
+
+            view.SendScintilla(QsciScintilla.SCI_TARGETFROMSELECTION)
+            view.SendScintilla(
+                QsciScintilla.SCI_REPLACETARGET, len(replacement), replacement
+            )
+
+        self.find_next()
+
+    def replace_all(self):
+        """Replaces all the matches at once. The part of the document from
+        the first match to the last one is replaced as a whole, so it's a
+        single change to undo and the buffer gets a single text change event"""
+
+        view = self.view()
+
+        if view is None or self.regex is None or view.isReadOnly():
+            return
+
+        template = self.template()
+        end = view.length()
+        replaced = 0
+        pieces = []
+        first = None
+        last = 0
+
+        try:
+            for chunk in chunk_bounds(view, 0, end):
+                found = list(chunk_matches(view, self.regex, chunk, end, last))
+
+                if not found:
+                    continue
+
+                window = found[0][0]
+                matches = [match for _, match in found]
+                start = window.position_of(matches[0].start())
+
+                # Text between the matches of the chunks stays as it is
+                if first is None:
+                    first = start
+                elif last > chunk[0]:
+                    pieces.append(
+                        window.text[window.index_of(last) : matches[0].start()]
+                    )
+                else:
+                    pieces.append(document_text(view, last, start))
+
+                pieces.append(self.substitute(matches, template, last <= chunk[0]))
+                last = window.position_of(matches[-1].end())
+                replaced += len(matches)
+        except re.error as error:
+            self.status.setText(f"Invalid replacement: {error}")
+            return
+
+        if first is None:
+            return
+
+        text = encode_text("".join(pieces))
+
+        view.beginUndoAction()
+        view.SendScintilla(QsciScintilla.SCI_SETTARGETRANGE, first, last)
+        view.SendScintilla(QsciScintilla.SCI_REPLACETARGET, len(text), text)
+        view.endUndoAction()
+
+        self.core.statusBar().showMessage(f"Replaced {replaced} matches", 3000)
+
+    def refresh_matches(self):
+        """Highlights the visible matches again and starts counting the
+        matches of the whole document"""
+
+        self.refresh_timer.stop()
+        self.schedule_highlight()
+
+        self.count = 0
+        view = self.view()
+
+        if view is None or self.regex is None:
+            self.counting = None
+            self.count_timer.stop()
+            return
+
+        self.counted_end = view.length()
+        self.counting = chunk_bounds(view, 0, self.counted_end)
+        self.resume = 0
+        self.count_timer.start(0)
+
+    def text_changed(self, buffer):
+        """Refreshes the matches a bit later if the text of the current
+        buffer changed"""
+
+        if self.isVisible() and buffer is self.core.buffers.current():
+            # Positions of the chunks left to count are wrong after the change
+            self.counting = None
+            self.count_timer.stop()
+            self.refresh_timer.start(FIND_REFRESH_DELAY)
+
+    def count_matches(self):
+        """Counts the matches in the next chunks of the document for a time
+        slice and schedules counting the rest"""
+
+        view = self.view()
+
+        if view is None or self.counting is None:
+            return
+
+        deadline = time.perf_counter() + COUNT_TIME_SLICE
+
+        for chunk in self.counting:
+            last = None
+
+            for last in chunk_matches(
+                view, self.regex, chunk, self.counted_end, self.resume
+            ):
+                self.count += 1
+
+            if last is not None:
+                window, match = last
+                self.resume = window.position_of(match.end())
+
+            if time.perf_counter() > deadline:
+                self.status.setText(f"{self.count} matches so far")
+                self.count_timer.start(0)
+                return
+
+        self.counting = None
+        self.status.setText(f"{self.count} matches")
+
+    def schedule_highlight(self):
+        self.highlight_timer.start(0)
+
+    def scrolled(self, updated):
+        if updated & QsciScintilla.SC_UPDATE_V_SCROLL:
+            self.schedule_highlight()
+
+    def visible_range(self, view):
+        """Returns (start, end) positions of the visible lines"""
+
+        first = view.SendScintilla(QsciScintilla.SCI_GETFIRSTVISIBLELINE)
+        shown = view.SendScintilla(QsciScintilla.SCI_LINESONSCREEN)
+
+        first_line = view.SendScintilla(QsciScintilla.SCI_DOCLINEFROMVISIBLE, first)
+        last_line = view.SendScintilla(
+            QsciScintilla.SCI_DOCLINEFROMVISIBLE, first + shown + 1
+        )
+
+        return (
+            view.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, first_line),
+            view.SendScintilla(QsciScintilla.SCI_GETLINEENDPOSITION, last_line),
+        )
+
+    def highlight(self):
+        """Highlights the matches in the visible part of the current buffer
+        removing the previous highlights"""
+
+        view = self.view()
+        previous, self.highlighted = self.highlighted, None
+
+        # Views of closed and hibernated tabs may be deleted already
+        if previous is not None:
+            try:
+                previous.SCN_UPDATEUI.disconnect(self.scrolled)
+                previous.SendScintilla(
+                    QsciScintilla.SCI_SETINDICATORCURRENT, FIND_INDICATOR
+                )
+                previous.SendScintilla(
+                    QsciScintilla.SCI_INDICATORCLEARRANGE, 0, previous.length()
+                )
+            except (RuntimeError, TypeError):
+                pass
+
+        if view is None or self.regex is None or not self.isVisible():
+            return
+
+        self.highlighted = view
+        view.SCN_UPDATEUI.connect(self.scrolled)
+
+        view.SendScintilla(
+            QsciScintilla.SCI_INDICSETSTYLE,
+            FIND_INDICATOR,
+            QsciScintilla.INDIC_ROUNDBOX,
+        )
+        view.SendScintilla(
+            QsciScintilla.SCI_INDICSETFORE, FIND_INDICATOR, QColor(255, 200, 0)
+        )
+        view.SendScintilla(QsciScintilla.SCI_INDICSETALPHA, FIND_INDICATOR, 100)
+        view.SendScintilla(QsciScintilla.SCI_SETINDICATORCURRENT, FIND_INDICATOR)
+
+        for idx, (start, end) in enumerate(
+            find_matches(view, self.regex, *self.visible_range(view))
+        ):
+            if idx == MAX_HIGHLIGHTS:
+                break
+
+            view.SendScintilla(QsciScintilla.SCI_INDICATORFILLRANGE, start, end - start)
+
+
 class EditBuffer(Module):
     def __init__(self, core):
-        super().__init__(NAME, DESCRIPTION, DEFAULT_SETTINGS, core, can_disable=False)
+        super().__init__(
+            NAME,
+            DESCRIPTION,
+            DEFAULT_SETTINGS,
+            core,
+            can_disable=False,
+            events=TRIGGER_EVENTS,
+        )
 
     def load(self):
         super().load()
 
+        # Identifiers of the changed settings by every save. Buffers which
+        # aren't visible catch up with them when they become current
+        self.setting_changes = []
+
+        self.lexers = LexerPool(self.core)
+
         def core_gui_buffer_instance():
-            return EnhancedGuiBuffer(self.settings)
+            gui_buffer = EnhancedGuiBuffer(self.settings, lexers=self.lexers)
+            gui_buffer.settings_revision = len(self.setting_changes)
+
+            return gui_buffer
 
         self.core.gui_buffer_instance = core_gui_buffer_instance
 
+        core = self.core
+
+        self.find_bar = FindBar(core)
+        core.global_layout.addWidget(self.find_bar, 1, 1)
+
+        self.actions = []
+
+        for name, shortcut, func in (
+            ("Find", "Ctrl+F", lambda: self.find_bar.open()),
+            ("Replace", "Ctrl+H", lambda: self.find_bar.open(replacing=True)),
+            ("Find next", "F3", lambda: self.find_bar.find_next()),
+            ("Find previous", "Shift+F3", lambda: self.find_bar.find_previous()),
+        ):
+            action = QAction(name, core)
+            action.setShortcut(QKeySequence(shortcut))
+            action.triggered.connect(func)
+            core.file_menu.addAction(action)
+            self.actions.append(action)
+
     def unload(self):
         super().unload()
 
         self.core.gui_buffer_instance = self.core._Core__gui_buffer_instance
 
-    def refresh(self):
-        super().refresh()
+        for action in self.actions:
+            self.core.file_menu.removeAction(action)
 
-        core = self.core
-        event = core.last_event()
-        buffers = core.buffers.buffers
+        self.find_bar.dismiss()
+        self.core.global_layout.removeWidget(self.find_bar)
+        self.find_bar.deleteLater()
+
+    def refresh(self, event=None, payload=None):
+        super().refresh(event, payload)
+
+        if event in {Event.BUFFER_TEXT_CHANGED, Event.FILE_RELOADED}:
+            self.find_bar.text_changed(payload)
+            return
+
+        if event == Event.TAB_CHANGED and self.find_bar.isVisible():
+            self.find_bar.refresh_matches()
+
+        if event in {Event.SETTING_CHANGED, Event.SETTINGS_SAVED}:
+            changed = self.changed_settings(payload)
+
+            if not changed:
+                return
+
+            self.setting_changes.append(changed)
+
+            # Only the visible buffer gets the changes right away
+            try:
+                payload = self.core.buffers.current()
+            except (AttributeError, KeyError):
+                return
+
+        if payload is None:
+            return
+
+        gui_buffer = payload.view
+
+        if event == Event.FILE_OPENED:
+            gui_buffer.large_file_detected = self.is_large_file(payload.file)
+
+        gui_buffer.refresh(
+            self.settings, event, payload, self.pending_settings(gui_buffer)
+        )
+        gui_buffer.settings_revision = len(self.setting_changes)
+
+    def pending_settings(self, gui_buffer):
+        """Returns identifiers of the settings changed since they were applied
+        to the buffer"""
+
+        return set().union(*self.setting_changes[gui_buffer.settings_revision :])
+
+    def is_large_file(self, path):
+        """Returns whether the file exceeds the size or line length thresholds
+        of the large file mode. Files which can't be read aren't large, they
+        may be gone since the tab was opened"""
+
+        if path is None:
+            return False
+
+        try:
+            if os.path.getsize(path) > self["large_file_size"].get_value() << 20:
+                return True
+
+            with open(path, mode="rb") as file:
+                sample = file.read(LINE_LENGTH_SAMPLE_SIZE)
+        except OSError:
+            return False
+
+        longest = max(map(len, sample.split(b"\n")))
 
-        for gui_buffer, abs_buffer in buffers.items():
-            gui_buffer.refresh(self.settings, event, abs_buffer)
+        return longest > self["large_file_line_length"].get_value()
@@ -0,0 +1,504 @@
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    BrokenExecutor,
+    ProcessPoolExecutor,
+    wait,
+)
+from event import Event
+from index import INDEX_FILE, TrigramIndex, index_and_search, query_trigrams
+from module import Module
+from search import compile_pattern, search_files, walk
+from setting import BoolSetting, IntSetting, StringSetting
+
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtWidgets import (
+    QAction,
+    QCheckBox,
+    QDockWidget,
+    QFileDialog,
+    QHBoxLayout,
+    QLabel,
+    QLineEdit,
+    QListWidget,
+    QListWidgetItem,
+    QPushButton,
+    QVBoxLayout,
+    QWidget,
+)
+
+import multiprocessing
+import os
+import re
+import sqlite3
+
+NAME = "Find in files"
+DESCRIPTION = "Searches for text in all the files of a directory"
+
+DEFAULT_SETTINGS = {
+    "ignored": StringSetting(
+        name="Ignored files",
+        description="Comma-separated glob patterns of the names of files and directories which aren't searched",
+        value=".git, .hg, .svn, __pycache__, node_modules, .venv, venv, *.pyc, *.o, *.so, *.min.js",
+    ),
+    "max_matches": IntSetting(
+        name="Maximum number of matches",
+        value=10000,
+        min_value=1,
+        max_value=1000000,
+    ),
+    "use_index": BoolSetting(
+        name="Use trigram index",
+        description=f"Keep an index of the searched files in {INDEX_FILE} so that only the files which may contain the text get searched. The first search of a directory builds the index, later ones only look at the changed files",
+        value=False,
+    ),
+    "processes": IntSetting(
+        name="Search processes",
+        description="Number of processes searching the files. Zero means the number of processor cores",
+        value=0,
+        max_value=256,
+    ),
+}
+
+TRIGGER_EVENTS = (Event.FILE_SAVED, Event.FILE_SAVED_AS, Event.FILE_RELOADED)
+
+# Number of files searched by a worker process at once
+SEARCH_BATCH_SIZE = 64
+
+
+class FileSearcher(QThread):
+    """Searches for the pattern in the files of the directory in background.
+    Files are walked through by the thread and searched in batches by the pool
+    of processes. Matches of every file get emitted as soon as its batch is
+    searched. Searching stops after cancellation or when the number of matches
+    reaches the limit.
+
+    If the path of the trigram index is passed, only the files which may
+    contain the pattern according to it are searched. Files changed since they
+    were indexed get indexed again and searched as well. Stale files are
+    indexed again regardless of their modification time"""
+
+    found = pyqtSignal(str, list)
+
+    def __init__(
+        self,
+        pool,
+        root,
+        pattern,
+        regex,
+        case,
+        ignored,
+        max_matches,
+        index=None,
+        stale=(),
+    ):
+        super().__init__()
+
+        self.pool = pool
+        self.root = root
+        self.search = (pattern, regex, case, max_matches)
+        self.ignored = ignored
+        self.max_matches = max_matches
+        self.index_path = index
+        self.index = None
+        self.stale = stale
+        self.matches = 0
+        self.files = 0
+        self.error = None
+        self.canceled = False
+        self.limit_reached = False
+
+    def cancel(self):
+        """Stops searching. Matches already emitted should be ignored by the
+        receiver checking the canceled flag"""
+
+        self.canceled = True
+        self.requestInterruption()
+
+    def submit(self, paths, indexing=False):
+        self.files += len(paths)
+
+        if indexing:
+            return self.pool.submit(index_and_search, paths, *self.search)
+
+        return self.pool.submit(search_files, paths, *self.search)
+
+    def collect(self, futures, timeout=0):
+        """Emits matches of the searched batches and returns the pending
+        ones. Batches which were indexed update the index"""
+
+        done, pending = wait(futures, timeout, FIRST_COMPLETED)
+
+        for future in done:
+            results = future.result()
+
+            if self.index is not None and isinstance(results, tuple):
+                entries, results = results
+
+                for entry in entries:
+                    self.index.update(*entry)
+
+            for path, matches in results:
+                if self.limit_reached:
+                    break
+
+                self.matches += len(matches)
+                self.found.emit(path, matches)
+
+                # Emitted matches are still shown, only the search stops
+                if self.matches >= self.max_matches:
+                    self.limit_reached = True
+                    self.requestInterruption()
+
+        return pending
+
+    def walk_changed(self):
+        """Returns paths of the files to be searched as (not changed since
+        they were indexed, changed) pair. Files which are gone get removed from
+        the index"""
+
+        indexed = self.index.files_under(self.root)
+        unchanged, changed = [], []
+
+        for path in walk(self.root, self.ignored):
+            if self.isInterruptionRequested():
+                break
+
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            entry = indexed.pop(path, None)
+
+            if entry is not None and entry[1:] == (stat.st_mtime_ns, stat.st_size):
+                unchanged.append((entry[0], path))
+            else:
+                changed.append(path)
+
+        if not self.isInterruptionRequested():
+            self.index.remove(indexed)
+
+        return unchanged, changed
+
+    def batches(self):
+        """Yields (paths, whether they should be indexed) batches of the files
+        to be searched"""
+
+        if self.index is None:
+            batch = []
+
+            for path in walk(self.root, self.ignored):
+                batch.append(path)
+
+                if len(batch) == SEARCH_BATCH_SIZE:
+                    yield batch, False
+                    batch = []
+
+            yield batch, False
+            return
+
+        unchanged, changed = self.walk_changed()
+        candidates = self.index.candidates(query_trigrams(*self.search[:3]))
+
+        paths = [
+            path for id, path in unchanged if candidates is None or id in candidates
+        ]
+
+        for start in range(0, len(paths), SEARCH_BATCH_SIZE):
+            yield paths[start : start + SEARCH_BATCH_SIZE], False
+
+        for start in range(0, len(changed), SEARCH_BATCH_SIZE):
+            yield changed[start : start + SEARCH_BATCH_SIZE], True
+
+    def run(self):
+        futures = set()
+
+        try:
+            if self.index_path is not None:
+                self.index = TrigramIndex(self.index_path)
+
+                for path in self.stale:
+                    self.index.invalidate(path)
+
+            for batch, indexing in self.batches():
+                if self.isInterruptionRequested():
+                    break
+
+                if batch:
+                    futures.add(self.submit(batch, indexing))
+                    futures = self.collect(futures)
+
+            while futures and not self.isInterruptionRequested():
+                futures = self.collect(futures, 0.05)
+        except (BrokenExecutor, OSError, sqlite3.Error) as error:
+            # Worker processes may die or fail to start and the index may be
+            # unavailable
+            self.error = error
+        finally:
+            for future in futures:
+                future.cancel()
+
+            if self.index is not None:
+                self.index.close()
+
+
+class SearchPanel(QWidget):
+    """Panel with the search query and the list of found matches"""
+
+    def __init__(self):
+        super().__init__()
+
+        self.pattern = QLineEdit()
+        self.pattern.setPlaceholderText("Text to find")
+
+        self.regex = QCheckBox("Regular expression")
+        self.case = QCheckBox("Match case")
+
+        self.directory = QLineEdit()
+        self.directory.setPlaceholderText("Directory")
+
+        self.browse_button = QPushButton("...")
+        self.search_button = QPushButton("Search")
+
+        self.status = QLabel()
+        self.results = QListWidget()
+        self.results.setUniformItemSizes(True)
+
+        self.query_layout = QHBoxLayout()
+        self.query_layout.addWidget(self.pattern)
+        self.query_layout.addWidget(self.regex)
+        self.query_layout.addWidget(self.case)
+
+        self.directory_layout = QHBoxLayout()
+        self.directory_layout.addWidget(self.directory)
+        self.directory_layout.addWidget(self.browse_button)
+        self.directory_layout.addWidget(self.search_button)
+
+        self.main_layout = QVBoxLayout()
+        self.main_layout.addLayout(self.query_layout)
+        self.main_layout.addLayout(self.directory_layout)
+        self.main_layout.addWidget(self.status)
+        self.main_layout.addWidget(self.results)
+
+        self.setLayout(self.main_layout)
+
+
+class FindInFiles(Module):
+    def __init__(self, core):
+        super().__init__(
+            NAME, DESCRIPTION, DEFAULT_SETTINGS, core, events=TRIGGER_EVENTS
+        )
+
+    def load(self):
+        super().load()
+
+        core = self.core
+
+        self.searcher = None
+
+        # Files changed by the editor since the last search, they get indexed
+        # again on the next one
+        self.stale = set()
+
+        # Worker processes are started on the first search and kept for the
+        # next ones
+        self.pool = None
+
+        self.panel = SearchPanel()
+        self.panel.pattern.returnPressed.connect(self.search)
+        self.panel.directory.returnPressed.connect(self.search)
+        self.panel.search_button.clicked.connect(self.toggle_search)
+        self.panel.browse_button.clicked.connect(self.browse)
+        self.panel.results.itemActivated.connect(self.go_to_match)
+
+        self.dock = QDockWidget("Find in files", core)
+        self.dock.setObjectName("find_in_files_dock")
+        self.dock.setWidget(self.panel)
+        self.dock.hide()
+        core.addDockWidget(Qt.BottomDockWidgetArea, self.dock)
+
+        self.action = QAction("Find in files", core)
+        self.action.setShortcut(QKeySequence("Ctrl+Shift+F"))
+        self.action.triggered.connect(self.show_panel)
+        core.file_menu.addAction(self.action)
+
+    def unload(self):
+        super().unload()
+
+        self.cancel()
+
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+        self.core.file_menu.removeAction(self.action)
+        self.core.removeDockWidget(self.dock)
+        self.dock.deleteLater()
+
+    def show_panel(self):
+        """Shows the panel with the directory of the current file chosen"""
+
+        panel = self.panel
+
+        if not panel.directory.text():
+            file = self.core.buffers.current().file
+            panel.directory.setText(
+                os.getcwd() if file is None else os.path.dirname(os.path.abspath(file))
+            )
+
+        # Worker processes take time to start, so it's done beforehand
+        self.get_pool().submit(int)
+
+        self.dock.show()
+        self.dock.raise_()
+        panel.pattern.setFocus()
+        panel.pattern.selectAll()
+
+    def browse(self):
+        directory = QFileDialog.getExistingDirectory(
+            self.core, "Find in files", self.panel.directory.text()
+        )
+
+        if directory:
+            self.panel.directory.setText(directory)
+
+    def get_pool(self):
+        if self.pool is None:
+            # Forking the process with running Qt threads isn't safe
+            self.pool = ProcessPoolExecutor(
+                self["processes"].get_value() or None,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        return self.pool
+
+    def ignored(self):
+        return tuple(
+            pattern.strip()
+            for pattern in self["ignored"].get_value().split(",")
+            if pattern.strip()
+        )
+
+    def toggle_search(self):
+        if self.searcher is not None:
+            self.cancel()
+        else:
+            self.search()
+
+    def search(self):
+        """Starts searching cancelling the previous search"""
+
+        panel = self.panel
+        pattern = panel.pattern.text()
+        directory = os.path.realpath(panel.directory.text())
+        regex = panel.regex.isChecked()
+        case = panel.case.isChecked()
+
+        self.cancel()
+        panel.results.clear()
+
+        if not pattern:
+            return
+
+        if not os.path.isdir(directory):
+            panel.status.setText(f"No such directory: {directory}")
+            return
+
+        try:
+            compile_pattern(pattern, regex, case)
+        except re.error as error:
+            panel.status.setText(f"Invalid regular expression: {error}")
+            return
+
+        searcher = self.searcher = FileSearcher(
+            self.get_pool(),
+            directory,
+            pattern,
+            regex,
+            case,
+            self.ignored(),
+            self["max_matches"].get_value(),
+            INDEX_FILE if self["use_index"].get_value() else None,
+            self.stale,
+        )
+        self.stale = set()
+
+        def finish():
+            # Broken pool can't be used anymore
+            if searcher.error is not None:
+                self.pool = None
+
+            if self.searcher is not searcher:
+                return
+
+            self.searcher = None
+            panel.search_button.setText("Search")
+
+            if searcher.error is not None:
+                panel.status.setText(f"Search failed: {searcher.error}")
+            else:
+                self.show_status(searcher, done=True)
+
+        searcher.found.connect(
+            lambda path, matches: self.add_matches(searcher, path, matches)
+        )
+        searcher.finished.connect(finish)
+
+        panel.search_button.setText("Cancel")
+        panel.status.setText("Searching...")
+
+        searcher.start()
+
+    def cancel(self):
+        if self.searcher is None:
+            return
+
+        self.searcher.cancel()
+        self.searcher.wait()
+
+    def add_matches(self, searcher, path, matches):
+        if searcher is not self.searcher or searcher.canceled:
+            return
+
+        results = self.panel.results
+        name = os.path.relpath(path, searcher.root)
+
+        for line, column, preview in matches:
+            item = QListWidgetItem(f"{name}:{line + 1}: {preview.strip()}")
+            item.setData(Qt.UserRole, (path, line, column))
+            results.addItem(item)
+
+        self.show_status(searcher)
+
+    def show_status(self, searcher, done=False):
+        count = self.panel.results.count()
+
+        if done and searcher.canceled:
+            state = "stopped"
+        elif done and searcher.limit_reached:
+            state = "limit reached"
+        elif done:
+            state = "done"
+        else:
+            state = "searching"
+
+        self.panel.status.setText(f"{count} matches in {searcher.files} files, {state}")
+
+    def go_to_match(self, item):
+        path, line, column = item.data(Qt.UserRole)
+
+        # The file may be gone or changed since it was searched
+        try:
+            buffer = self.core.go_to(path, line, column)
+        except OSError as error:
+            self.panel.status.setText(f"Failed to open {path}: {error}")
+            return
+
+        if buffer is None:
+            self.panel.status.setText(f"Failed to decode {path}")
+
+    def refresh(self, event=None, payload=None):
+        super().refresh(event, payload)
+
+        if payload is not None and payload.file is not None:
+            self.stale.add(os.path.realpath(payload.file))
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+
+from event import Event
+from module import Module
+from setting import IntSetting
+
+from PyQt5.QtCore import QTimer
+
+NAME = "Tab hibernation"
+DESCRIPTION = "Releases memory of the least recently used tabs when the open files take more than the budget. Tabs without unsaved changes are read from the disk again when activated, unsaved changes are kept compressed"
+
+DEFAULT_SETTINGS = {
+    "memory_budget": IntSetting(
+        name="Memory budget",
+        description="Approximate memory in megabytes the editing buffers of the tabs may take",
+        value=256,
+        min_value=1,
+        max_value=65536,
+    ),
+}
+
+TRIGGER_EVENTS = (
+    Event.NEW_BUFFER_CREATED,
+    Event.FILE_OPENED,
+    Event.BUFFER_TEXT_CHANGED,
+    Event.TAB_CHANGED,
+    Event.TAB_CLOSED,
+    Event.SETTINGS_SAVED,
+)
+
+# Approximate memory taken by the widget of an editing buffer and by every
+# byte of its text, including styles and the undo history, in bytes
+BUFFER_OVERHEAD = 100 << 10
+BYTES_PER_CHAR = 4
+
+
+class Hibernation(Module):
+    def __init__(self, core):
+        super().__init__(
+            NAME, DESCRIPTION, DEFAULT_SETTINGS, core, events=TRIGGER_EVENTS
+        )
+
+    def load(self):
+        super().load()
+
+        # Buffers from the least to the most recently used
+        self.used = OrderedDict()
+
+        # Approximate memory of the editing buffers as of the last check and
+        # their sum, edits update only the memory of the edited buffer
+        self.memory = {}
+        self.total = 0
+
+        # Budget is checked once after a bunch of events
+        self.timer = QTimer(self.core)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.enforce_budget)
+
+    def unload(self):
+        super().unload()
+
+        self.timer.stop()
+        self.timer.deleteLater()
+
+    def budget(self):
+        return self["memory_budget"].get_value() << 20
+
+    def buffer_memory(self, buffer):
+        """Returns the approximate memory the editing buffer takes"""
+
+        return BUFFER_OVERHEAD + buffer.length() * BYTES_PER_CHAR
+
+    def can_hibernate(self, buffer):
+        core = self.core
+
+        return not (
+            buffer.view.placeholder
+            or buffer.loading
+            or buffer in core.writers
+            or buffer is core.buffers.current()
+        )
+
+    def enforce_budget(self):
+        """Hibernates the least recently used buffers until the rest of them
+        fit in the budget"""
+
+        core = self.core
+        memory = self.memory = {
+            buffer: self.buffer_memory(buffer)
+            for buffer in core.buffers.buffers.values()
+            if not buffer.view.placeholder
+        }
+        total = self.total = sum(memory.values())
+        budget = self.budget()
+
+        if total <= budget:
+            return
+
+        awake = list(memory)
+
+        # Buffers which were never used go first
+        order = {buffer: idx for idx, buffer in enumerate(self.used)}
+        awake.sort(key=lambda buffer: order.get(buffer, -1))
+
+        for buffer in awake:
+            if total <= budget:
+                break
+
+            if not self.can_hibernate(buffer):
+                continue
+
+            total -= memory.pop(buffer)
+            core.hibernate_buffer(buffer)
+
+        self.total = total
+
+    def edited(self, buffer):
+        """Updates the memory of the edited buffer and checks the budget only
+        if the edit made it exceeded. Buffers left over the budget by the last
+        check can't be hibernated until the tabs change anyway"""
+
+        if buffer not in self.memory:
+            self.schedule()
+            return
+
+        memory = self.buffer_memory(buffer)
+        total = self.total + memory - self.memory[buffer]
+        budget = self.budget()
+
+        if self.total <= budget < total:
+            self.schedule()
+
+        self.total = total
+        self.memory[buffer] = memory
+
+    def schedule(self):
+        if not self.timer.isActive():
+            self.timer.start(0)
+
+    def refresh(self, event=None, payload=None):
+        super().refresh(event, payload)
+
+        if event == Event.TAB_CLOSED:
+            self.used.pop(payload, None)
+            self.total -= self.memory.pop(payload, 0)
+            return
+
+        if payload is not None and event != Event.SETTINGS_SAVED:
+            self.used[payload] = None
+            self.used.move_to_end(payload)
+
+        if event == Event.BUFFER_TEXT_CHANGED:
+            self.edited(payload)
+        else:
+            self.schedule()
@@ -22,6 +22,7 @@ class Menu(Module):
             (core.open_file_action, lambda: core.open_file()),
             (core.settings_action, lambda: core.open_settings()),
             (core.about_action, lambda: core.open_about_dialog()),
+            (core.profiler_action, lambda: core.open_profiler()),
         )
 
         for action, func in self.links:
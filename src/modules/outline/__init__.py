@@ -0,0 +1,266 @@
+from collections import OrderedDict
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+
+from event import Event
+from module import Module
+from modules.edit_buffer import document_bytes
+from code_outline import parse_outline
+from setting import IntSetting
+from utils import FileType
+
+from PyQt5.Qsci import QsciScintilla
+from PyQt5.QtCore import QObject, Qt, QTimer, pyqtSignal
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtWidgets import QDockWidget, QTreeWidget, QTreeWidgetItem
+
+import hashlib
+import multiprocessing
+
+NAME = "Outline"
+DESCRIPTION = "Shows classes, functions and methods of the current Python file in a side panel and jumps to them"
+
+DEFAULT_SETTINGS = {
+    "delay": IntSetting(
+        name="Refresh delay",
+        description="Time in milliseconds after the last edit before the outline is refreshed",
+        value=500,
+        max_value=10000,
+    ),
+}
+
+TRIGGER_EVENTS = (
+    Event.FILE_OPENED,
+    Event.FILE_SAVED_AS,
+    Event.FILE_RELOADED,
+    Event.BUFFER_TEXT_CHANGED,
+    Event.TAB_CHANGED,
+)
+
+# Files bigger than that number of bytes aren't parsed
+MAX_PARSED_SIZE = 16 << 20
+
+# Number of outlines kept by the hashes of the code they were parsed from
+OUTLINE_CACHE_SIZE = 64
+
+
+class OutlineParser(QObject):
+    """Parses code in a worker process. Results are emitted in the GUI thread
+    with the key they were requested with"""
+
+    parsed = pyqtSignal(object, object)
+
+    def __init__(self):
+        super().__init__()
+
+        # The worker process is started on the first parse and kept for the
+        # next ones
+        self.pool = None
+
+    def parse(self, key, source):
+        if self.pool is None:
+            # Forking the process with running Qt threads isn't safe
+            self.pool = ProcessPoolExecutor(
+                1, mp_context=multiprocessing.get_context("spawn")
+            )
+
+        try:
+            future = self.pool.submit(parse_outline, source)
+        except (BrokenExecutor, RuntimeError) as error:
+            self.pool = None
+            self.parsed.emit(key, (None, f"Parsing failed: {error}"))
+            return
+
+        # Called in the thread of the pool, the signal gets queued
+        future.add_done_callback(lambda future: self.finish(key, future))
+
+    def finish(self, key, future):
+        if future.cancelled():
+            return
+
+        try:
+            result = future.result()
+        except (BrokenExecutor, OSError) as error:
+            # Broken pool can't be used anymore
+            self.pool = None
+            result = (None, f"Parsing failed: {error}")
+
+        self.parsed.emit(key, result)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class Outline(Module):
+    def __init__(self, core):
+        super().__init__(
+            NAME, DESCRIPTION, DEFAULT_SETTINGS, core, events=TRIGGER_EVENTS
+        )
+
+    def load(self):
+        super().load()
+
+        core = self.core
+
+        # Outlines by the hashes of the code, the most recently used last
+        self.cache = OrderedDict()
+
+        # Hash of the code of the current buffer and the ones being parsed
+        self.wanted = None
+        self.parsing = set()
+
+        # Buffer whose outline is wanted, symbols shown in the panel and the
+        # buffer they belong to
+        self.buffer = None
+        self.shown = None
+        self.shown_buffer = None
+
+        self.parser = OutlineParser()
+        self.parser.parsed.connect(self.parsed)
+
+        self.tree = QTreeWidget()
+        self.tree.setHeaderHidden(True)
+        self.tree.setUniformRowHeights(True)
+        self.tree.itemActivated.connect(self.go_to_symbol)
+
+        self.dock = QDockWidget("Outline", core)
+        self.dock.setObjectName("outline_dock")
+        self.dock.setWidget(self.tree)
+        self.dock.hide()
+        self.dock.visibilityChanged.connect(lambda visible: self.schedule(0))
+        core.addDockWidget(Qt.LeftDockWidgetArea, self.dock)
+
+        self.action = self.dock.toggleViewAction()
+        self.action.setShortcut(QKeySequence("Ctrl+Shift+O"))
+        core.file_menu.addAction(self.action)
+
+        # Edits are collected for a while before the code is parsed again
+        self.timer = QTimer(core)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.update)
+
+    def unload(self):
+        super().unload()
+
+        self.timer.stop()
+        self.timer.deleteLater()
+        self.parser.shutdown()
+
+        self.core.file_menu.removeAction(self.action)
+        self.core.removeDockWidget(self.dock)
+        self.dock.deleteLater()
+
+    def schedule(self, delay):
+        self.timer.start(delay)
+
+    def current(self):
+        """Returns the current buffer if it can be outlined, otherwise None"""
+
+        try:
+            buffer = self.core.buffers.current()
+        except (AttributeError, KeyError):
+            return None
+
+        if (
+            buffer.file_type() != FileType.PYTHON
+            or buffer.loading
+            or not isinstance(buffer.view, QsciScintilla)
+        ):
+            return None
+
+        return buffer
+
+    def update(self):
+        """Shows the outline of the current buffer, parses its code unless the
+        outline of the same code is known already"""
+
+        buffer = self.buffer = self.current()
+
+        if buffer is None or not self.dock.isVisible():
+            self.wanted = None
+            self.show(None, None)
+            return
+
+        view = buffer.view
+        length = view.length()
+
+        if length > MAX_PARSED_SIZE:
+            self.wanted = None
+            self.show(None, "The file is too big")
+            return
+
+        source = document_bytes(view, 0, length)
+        key = hashlib.blake2b(source, digest_size=16).digest()
+
+        self.wanted = key
+
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.show(*self.cache[key])
+            return
+
+        if key not in self.parsing:
+            self.parsing.add(key)
+            self.parser.parse(key, source)
+
+    def parsed(self, key, result):
+        self.parsing.discard(key)
+
+        self.cache[key] = result
+
+        if len(self.cache) > OUTLINE_CACHE_SIZE:
+            self.cache.popitem(last=False)
+
+        if key == self.wanted:
+            self.show(*result)
+
+    def show(self, symbols, error):
+        """Fills the panel with the symbols. Symbols of the code which can't
+        be parsed are kept until it's fixed"""
+
+        self.dock.setWindowTitle("Outline" if error is None else f"Outline ({error})")
+
+        if symbols is None and error is not None and self.shown_buffer is self.buffer:
+            return
+
+        if symbols == self.shown and self.shown_buffer is self.buffer:
+            return
+
+        self.shown = symbols
+        self.shown_buffer = self.buffer
+        self.tree.clear()
+
+        def add(parent, symbols):
+            for kind, name, line, column, children in symbols:
+                item = QTreeWidgetItem(parent, [f"{kind} {name}"])
+                item.setData(0, Qt.UserRole, (line, column))
+                add(item, children)
+
+        add(self.tree.invisibleRootItem(), symbols or ())
+        self.tree.expandAll()
+
+    def go_to_symbol(self, item):
+        buffer = self.buffer
+
+        if buffer is None or buffer is not self.core.buffers.current():
+            return
+
+        line, column = item.data(0, Qt.UserRole)
+        view = buffer.view
+
+        # Columns of the parser are in bytes
+        position = view.SendScintilla(QsciScintilla.SCI_POSITIONFROMLINE, line)
+        line, index = view.lineIndexFromPosition(position + column)
+
+        self.core.go_to(buffer.file, line, index)
+
+    def refresh(self, event=None, payload=None):
+        super().refresh(event, payload)
+
+        if payload is None or payload is not self.core.buffers.current():
+            return
+
+        if event == Event.BUFFER_TEXT_CHANGED:
+            self.schedule(self["delay"].get_value())
+        else:
+            self.schedule(0)
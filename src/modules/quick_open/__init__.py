@@ -0,0 +1,359 @@
+from collections import OrderedDict
+
+from event import Event
+from fuzzy import PathIndex
+from module import Module
+from search import walk
+from setting import IntSetting, StringSetting
+
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QKeySequence
+from PyQt5.QtWidgets import (
+    QAction,
+    QDialog,
+    QLabel,
+    QLineEdit,
+    QListWidget,
+    QVBoxLayout,
+)
+
+import os
+import time
+
+NAME = "Quick open"
+DESCRIPTION = (
+    "Opens files of the working directory found by a few characters of their paths"
+)
+
+DEFAULT_SETTINGS = {
+    "ignored": StringSetting(
+        name="Ignored files",
+        description="Comma-separated glob patterns of the names of files and directories which aren't offered",
+        value=".git, .hg, .svn, __pycache__, node_modules, .venv, venv, *.pyc, *.o, *.so",
+    ),
+    "max_files": IntSetting(
+        name="Maximum number of files",
+        description="Files of the working directory beyond that number aren't offered",
+        value=500000,
+        min_value=1,
+        max_value=10000000,
+    ),
+    "refresh_interval": IntSetting(
+        name="Refresh interval",
+        description="Time in seconds after which the list of files is collected again in background when the dialog is opened",
+        value=30,
+        max_value=86400,
+    ),
+}
+
+TRIGGER_EVENTS = (
+    Event.EDITOR_STARTED,
+    Event.FILE_OPENED,
+    Event.FILE_SAVED_AS,
+    Event.TAB_CHANGED,
+)
+
+# Number of the most recently used files ranked higher
+MAX_RECENT = 50
+
+# Number of the best matching files shown
+MAX_RESULTS = 50
+
+# Removed paths leave holes in the index, it's collected anew when there are
+# more of them than that share of its paths
+MAX_REMOVED_SHARE = 0.5
+
+
+class PathIndexer(QThread):
+    """Collects paths of the files in the directory and all its
+    subdirectories relative to it and prepares them for fuzzy matching in
+    background. Collecting stops at the maximum number of files. If the known
+    paths of the index are passed, only the added and the removed paths are
+    emitted, so the index gets updated in place"""
+
+    indexed = pyqtSignal(object)
+    changed = pyqtSignal(object, object)
+
+    def __init__(self, root, ignored, max_files, known=None):
+        super().__init__()
+
+        self.root = root
+        self.ignored = ignored
+        self.max_files = max_files
+        self.known = known
+
+    def run(self):
+        prefix = os.path.join(self.root, "")
+        paths = []
+
+        for path in walk(self.root, self.ignored):
+            if self.isInterruptionRequested():
+                return
+
+            paths.append(path[len(prefix) :])
+
+            if len(paths) == self.max_files:
+                break
+
+        if self.known is None:
+            index = PathIndex(self.root, paths)
+
+            if not self.isInterruptionRequested():
+                self.indexed.emit(index)
+
+            return
+
+        found = set(paths)
+
+        # New paths are added after the others, the shortest ones first
+        added = sorted(found - self.known, key=lambda path: (len(path), path))
+        removed = self.known - found
+
+        if not self.isInterruptionRequested():
+            self.changed.emit(added, removed)
+
+
+class QuickOpenDialog(QDialog):
+    """Popup with the query and the list of the matching files"""
+
+    def __init__(self, parent):
+        super().__init__(parent, Qt.Popup)
+
+        self.query = QLineEdit()
+        self.query.setPlaceholderText("File name")
+
+        self.status = QLabel()
+        self.results = QListWidget()
+        self.results.setUniformItemSizes(True)
+
+        self.main_layout = QVBoxLayout()
+        self.main_layout.addWidget(self.query)
+        self.main_layout.addWidget(self.results)
+        self.main_layout.addWidget(self.status)
+
+        self.setLayout(self.main_layout)
+
+    def keyPressEvent(self, event):
+        # Results are chosen without leaving the query
+        if event.key() in {Qt.Key_Up, Qt.Key_Down, Qt.Key_PageUp, Qt.Key_PageDown}:
+            self.results.keyPressEvent(event)
+        elif event.key() in {Qt.Key_Return, Qt.Key_Enter}:
+            self.accept()
+        else:
+            super().keyPressEvent(event)
+
+
+class QuickOpen(Module):
+    def __init__(self, core):
+        super().__init__(
+            NAME, DESCRIPTION, DEFAULT_SETTINGS, core, events=TRIGGER_EVENTS
+        )
+
+    def load(self):
+        super().load()
+
+        core = self.core
+
+        # Index of the paths and the time it was started to be collected
+        self.index = None
+        self.indexed_at = None
+        self.indexer = None
+
+        # Paths shown in the list. Text of its items can't hold file names
+        # which aren't valid UTF-8
+        self.shown = []
+
+        # Real paths of the used files from the least to the most recent
+        self.recent = OrderedDict()
+
+        self.dialog = QuickOpenDialog(core)
+        self.dialog.query.textChanged.connect(self.update_results)
+        self.dialog.results.itemActivated.connect(self.dialog.accept)
+        self.dialog.accepted.connect(self.open_selected)
+
+        self.action = QAction("Quick open", core)
+        self.action.setShortcut(QKeySequence("Ctrl+P"))
+        self.action.triggered.connect(self.show_dialog)
+        core.file_menu.addAction(self.action)
+
+    def unload(self):
+        super().unload()
+
+        if self.indexer is not None:
+            self.indexer.requestInterruption()
+            self.indexer.wait()
+
+        self.core.file_menu.removeAction(self.action)
+        self.dialog.deleteLater()
+
+    def ignored(self):
+        return tuple(
+            pattern.strip()
+            for pattern in self["ignored"].get_value().split(",")
+            if pattern.strip()
+        )
+
+    def start_indexing(self):
+        """Starts collecting the paths of the files of the working directory
+        in background unless it's being done already"""
+
+        if self.indexer is not None:
+            return
+
+        root = os.path.realpath(os.getcwd())
+        index = self.index
+        known = None
+
+        # The index of the same directory is kept and updated
+        if (
+            index is not None
+            and index.root == root
+            and len(index) >= len(index.paths) * (1 - MAX_REMOVED_SHARE)
+        ):
+            known = set(index.indices)
+
+        indexer = self.indexer = PathIndexer(
+            root, self.ignored(), self["max_files"].get_value(), known
+        )
+        self.indexed_at = time.monotonic()
+
+        def finish():
+            if self.indexer is indexer:
+                self.indexer = None
+
+            if self.index is not None and self.dialog.isVisible():
+                self.show_status()
+
+        indexer.indexed.connect(self.set_index)
+        indexer.changed.connect(self.update_index)
+        indexer.finished.connect(finish)
+        indexer.start()
+
+    def set_index(self, index):
+        self.index = index
+
+        if self.dialog.isVisible():
+            self.update_results()
+
+    def update_index(self, added, removed):
+        """Adds and removes the paths of the files created and deleted since
+        the index was collected"""
+
+        for path in removed:
+            self.index.remove(path)
+
+        for path in added:
+            self.index.add(path)
+
+        if self.dialog.isVisible():
+            self.update_results()
+
+    def index_outdated(self):
+        return (
+            self.indexed_at is None
+            or time.monotonic() - self.indexed_at > self["refresh_interval"].get_value()
+        )
+
+    def show_dialog(self):
+        core = self.core
+        dialog = self.dialog
+
+        if self.index_outdated():
+            self.start_indexing()
+
+        width = max(core.width() // 2, 400)
+        dialog.resize(width, core.height() // 2)
+        dialog.move(core.mapToGlobal(core.rect().center()).x() - width // 2, core.y())
+
+        dialog.query.clear()
+        self.update_results()
+
+        dialog.show()
+        dialog.query.setFocus()
+
+    def recent_paths(self):
+        """Returns paths of the recently used files in the index from the most
+        recent one"""
+
+        root = os.path.join(self.index.root, "")
+
+        return [
+            path[len(root) :]
+            for path in reversed(self.recent)
+            if path.startswith(root) and path[len(root) :] in self.index
+        ]
+
+    def update_results(self):
+        dialog = self.dialog
+        dialog.results.clear()
+        self.shown = []
+
+        if self.index is None:
+            dialog.status.setText("Collecting files...")
+            return
+
+        paths = self.shown = self.index.rank(
+            dialog.query.text(), self.recent_paths(), MAX_RESULTS
+        )
+
+        dialog.results.addItems(paths)
+        dialog.results.setCurrentRow(0)
+
+        self.show_status()
+
+    def show_status(self):
+        indexing = ", collecting again..." if self.indexer is not None else ""
+        self.dialog.status.setText(f"{len(self.index)} files{indexing}")
+
+    def open_selected(self):
+        """Opens the chosen file or makes its tab current if it's open"""
+
+        row = self.dialog.results.currentRow()
+
+        if not 0 <= row < len(self.shown) or self.index is None:
+            return
+
+        core = self.core
+        name = self.shown[row]
+        path = os.path.join(self.index.root, name)
+        buffer = core.find_buffer(path)
+
+        if buffer is not None:
+            core.tabbar.setCurrentIndex(core.tabbar.indexOf(buffer.view))
+            return
+
+        try:
+            buffer = core.open_path(path)
+        except OSError as error:
+            self.index.remove(name)
+            core.statusBar().showMessage(f"Failed to open {name}: {error}", 3000)
+            return
+
+        if buffer is None:
+            core.statusBar().showMessage(f"Failed to decode {name}", 3000)
+
+    def refresh(self, event=None, payload=None):
+        super().refresh(event, payload)
+
+        # Collecting the files right on startup makes the first search instant
+        if event == Event.EDITOR_STARTED:
+            self.start_indexing()
+            return
+
+        if payload is None or payload.file is None:
+            return
+
+        path = os.path.realpath(payload.file)
+
+        self.recent[path] = None
+        self.recent.move_to_end(path)
+
+        if len(self.recent) > MAX_RECENT:
+            self.recent.popitem(last=False)
+
+        # Files created by the editor are offered right away
+        if event == Event.FILE_SAVED_AS and self.index is not None:
+            root = os.path.join(self.index.root, "")
+
+            if path.startswith(root):
+                self.index.add(path[len(root) :])
@@ -0,0 +1,117 @@
+from event import Event
+from module import Module
+
+import json
+import os
+import zlib
+
+NAME = "Session"
+DESCRIPTION = "Reopens the tabs which were open when the editor was closed. Only the current tab is read at startup, other ones are read when activated"
+
+DEFAULT_SETTINGS = {}
+
+TRIGGER_EVENTS = (Event.EDITOR_STARTED, Event.EDITOR_CLOSING)
+
+
+class Session(Module):
+    def __init__(self, core):
+        super().__init__(
+            NAME, DESCRIPTION, DEFAULT_SETTINGS, core, events=TRIGGER_EVENTS
+        )
+
+    def collect(self):
+        """Returns the session: index of the current tab and (path, encoding,
+        confirmed, position, file stat the encoding was determined for) lists
+        of the tabs with files in the tabbar order"""
+
+        core = self.core
+        tabbar = core.tabbar
+        current = 0
+        tabs = []
+
+        for idx in range(tabbar.count()):
+            view = tabbar.widget(idx)
+            buffer = core.buffers.buffers.get(view)
+
+            if buffer is None or buffer.file is None:
+                continue
+
+            if idx == tabbar.currentIndex():
+                current = len(tabs)
+
+            tabs.append(
+                [
+                    os.path.abspath(buffer.file),
+                    buffer.file_encoding,
+                    buffer.encoding_confirmed,
+                    view.get_position(),
+                    buffer.encoding_stat,
+                ]
+            )
+
+        return {"current": current, "tabs": tabs}
+
+    def save(self):
+        """Saves the session to the database as compressed JSON"""
+
+        data = json.dumps(self.collect(), separators=(",", ":")).encode()
+
+        with self.core.con:
+            self.core.con.execute(
+                "INSERT OR REPLACE INTO session VALUES (0, ?)", (zlib.compress(data),)
+            )
+
+    def read(self):
+        row = self.core.con.execute("SELECT data FROM session WHERE id=0").fetchone()
+
+        if row is None:
+            return None
+
+        try:
+            return json.loads(zlib.decompress(row[0]))
+        except (zlib.error, ValueError):
+            return None
+
+    def restore(self):
+        """Reopens the tabs of the saved session. The current one is read
+        right away, the other ones get placeholders"""
+
+        session = self.read()
+
+        if session is None or not session["tabs"]:
+            return
+
+        current = session["tabs"][session["current"]]
+        tabs = [tab for tab in session["tabs"] if os.path.isfile(tab[0])]
+
+        if not tabs:
+            return
+
+        current = tabs.index(current) if current in tabs else 0
+
+        core = self.core
+        initial = core.buffers.current()
+
+        path, encoding, confirmed, position, *_ = tabs[current]
+
+        if core.open_path(path, position) is not None and initial.is_empty():
+            core.close_buffer(initial)
+
+        # Sessions saved by older versions have no file stats
+        for idx, (path, encoding, confirmed, position, *stat) in enumerate(tabs):
+            if idx != current:
+                core.open_placeholder(
+                    path,
+                    idx,
+                    (encoding, confirmed),
+                    position,
+                    encoding_stat=tuple(stat[0]) if stat and stat[0] else None,
+                )
+
+    def refresh(self, event=None, payload=None):
+        super().refresh(event, payload)
+
+        if event == Event.EDITOR_STARTED:
+            self.restore()
+        elif event == Event.EDITOR_CLOSING:
+            self.save()
@@ -1,4 +1,4 @@
-from PyQt5.QtWidgets import QLabel
+from PyQt5.QtWidgets import QLabel, QPushButton
 from module import Module
 from event import Event
 from modules.edit_buffer import EOL_WINDOWS
@@ -22,8 +22,14 @@ DEFAULT_SETTINGS = {
         description="EOL is the end of each text line of the file, may be either LF (\\n), or CR LF (\\r\\n)",
         value=True,
     ),
+    "show_large_file": BoolSetting(
+        name="Show large file mode",
+        description="Shows a button telling that the large file mode is active. Clicking it turns all the editing features back on for the file",
+        value=True,
+    ),
     "show_encoding": BoolSetting(
         name="Show file encoding",
+        description="Guessed rather than confirmed encoding is marked with a question mark",
         value=True,
     ),
 }
@@ -40,19 +46,48 @@ TRIGGER_EVENTS = (
 
 class Statusbar(Module):
     def __init__(self, core):
-        super().__init__(NAME, DESCRIPTION, DEFAULT_SETTINGS, core)
+        super().__init__(
+            NAME, DESCRIPTION, DEFAULT_SETTINGS, core, events=TRIGGER_EVENTS
+        )
 
     def load(self):
         super().load()
 
         self.widget = QLabel()
         self.core.statusBar().addWidget(self.widget)
+
+        self.large_file_button = QPushButton("Large file mode")
+        self.large_file_button.setFlat(True)
+        self.large_file_button.setCheckable(True)
+        self.large_file_button.setVisible(False)
+        self.large_file_button.clicked.connect(self.toggle_large_file_mode)
+        self.core.statusBar().addPermanentWidget(self.large_file_button)
+
         self.refresh()
 
     def unload(self):
         super().unload()
 
         self.core.statusBar().removeWidget(self.widget)
+        self.core.statusBar().removeWidget(self.large_file_button)
+
+    def toggle_large_file_mode(self, state):
+        self.core.buffers.current().view.set_large_file_mode(state)
+
+    def refresh_large_file_button(self, buffer):
+        """Shows the large file mode button if the buffer is a large file"""
+
+        view = buffer.view
+
+        self.large_file_button.setVisible(
+            self["show_large_file"].get_value() and view.large_file_detected
+        )
+        self.large_file_button.setChecked(view.large_file)
+        self.large_file_button.setToolTip(
+            "Click to turn all the editing features back on for this file"
+            if view.large_file
+            else "Click to turn the costly editing features off for this file"
+        )
 
     def generate(self, buffer):
         """Generates and returns statusbar text"""
@@ -68,6 +103,7 @@ class Statusbar(Module):
             "???"
             if buffer.file_encoding is None
             else buffer.file_encoding.replace("_", "-").upper()
+            + ("" if buffer.encoding_confirmed else "?")
         )
 
         comps = (
@@ -84,16 +120,17 @@ class Statusbar(Module):
 
         return self["delimiter"].value.join(enabled)
 
-    def refresh(self):
-        super().refresh()
+    def refresh(self, event=None, payload=None):
+        super().refresh(event, payload)
 
         core = self.core
 
-        if core.last_event() not in TRIGGER_EVENTS:
+        if event not in TRIGGER_EVENTS:
             return
 
         try:
-            info = self.generate(core.buffers.current())
-            self.widget.setText(info)
+            current = core.buffers.current()
+            self.widget.setText(self.generate(current))
+            self.refresh_large_file_button(current)
         except KeyError:
             pass
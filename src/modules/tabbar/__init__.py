@@ -1,20 +1,44 @@
+from functools import partial
 from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QMessageBox
-from PyQt5.Qsci import *
 from event import Event
 from module import Module
-from utils import SaveStatus
+from setting import IntSetting
 
 
 NAME = "Tabbar"
 DESCRIPTION = "Tabbar makes it able to switch tabs with buffer"
 
-DEFAULT_SETTINGS = {}
+DEFAULT_SETTINGS = {
+    "text_change_delay": IntSetting(
+        name="Text change refresh delay",
+        description="Time in milliseconds during which the editor collects text changes before refreshing its state. Zero means refreshing on the next event loop iteration",
+        value=16,
+        max_value=1000,
+    ),
+}
+
+TRIGGER_EVENTS = (
+    Event.NEW_BUFFER_CREATED,
+    Event.BUFFER_TEXT_CHANGED,
+    Event.FILE_OPENED,
+    Event.FILE_SAVED,
+    Event.FILE_SAVED_AS,
+    Event.TAB_CHANGED,
+    Event.FILE_RELOADED,
+)
 
 
 class Tabbar(Module):
     def __init__(self, core):
-        super().__init__(NAME, DESCRIPTION, DEFAULT_SETTINGS, core, can_disable=False)
+        super().__init__(
+            NAME,
+            DESCRIPTION,
+            DEFAULT_SETTINGS,
+            core,
+            can_disable=False,
+            events=TRIGGER_EVENTS,
+        )
 
     def ask_for_save(self):
         dialog = QMessageBox()
@@ -32,13 +56,14 @@ class Tabbar(Module):
         core = self.core
         tabbar = core.tabbar
         gui_buffer = tabbar.widget(idx)
+        buffer = core.buffers[gui_buffer]
 
         tabbar.removeTab(idx)
         core.buffers.remove(
             gui_buffer, new_current=tabbar.widget(tabbar.currentIndex())
         )
 
-        core.raise_event(Event.TAB_CLOSED)
+        core.raise_event(Event.TAB_CLOSED, buffer)
 
     def close_tab(self, idx):
         buffers = self.core.buffers
@@ -56,22 +81,58 @@ class Tabbar(Module):
 
         answer = self.ask_for_save()
 
-        if answer == QMessageBox.Cancel or (
-            answer == QMessageBox.Save
-            and self.core.save_file(buffer, raise_event=False) == SaveStatus.CANCELED
-        ):
+        if answer == QMessageBox.Cancel:
+            return
+
+        if answer == QMessageBox.Discard:
+            self.remove_tab_and_buffer(idx)
             return
 
-        self.remove_tab_and_buffer(idx)
+        # The text is kept until it's written, so a failed save loses nothing.
+        # Edits made meanwhile keep the tab open too
+        def close():
+            if buffer.synchronized:
+                self.core.close_buffer(buffer)
+
+        self.core.save_file(buffer, raise_event=False, done=close)
 
     def change_current(self, idx):
-        # return
         buffers = self.core.buffers
         tabbar = self.core.tabbar
         gui_buffer = tabbar.widget(idx)
-        # buffer = buffers[gui_buffer]
+        buffer = buffers.buffers.get(gui_buffer)
         buffers.current_link = gui_buffer
-        self.core.raise_event(Event.TAB_CHANGED)
+
+        # Placeholder tabs get their editing buffers on activation
+        if buffer is not None and gui_buffer.placeholder:
+            self.core.wake_buffer(buffer)
+
+        self.core.raise_event(Event.TAB_CHANGED, buffer)
+
+    def insert_tab(self, idx, buffer):
+        """Inserts a tab of the buffer without making it current"""
+
+        self.core.tabbar.insertTab(idx, buffer.view, buffer.name)
+
+        # New tabs have the color of synchronized ones already
+        if not buffer.synchronized:
+            self.highlight_desynced(buffer)
+
+    def replace_tab(self, gui_buffer, buffer):
+        """Puts the graphical buffer of the buffer in place of the passed one
+        keeping the tab where it is"""
+
+        tabbar = self.core.tabbar
+        idx = tabbar.indexOf(gui_buffer)
+        current = tabbar.currentIndex()
+
+        tabbar.blockSignals(True)
+        tabbar.removeTab(idx)
+        tabbar.insertTab(idx, buffer.view, buffer.name)
+        tabbar.setCurrentIndex(current)
+        tabbar.blockSignals(False)
+
+        self.highlight_desynced(buffer)
 
     def load(self):
         super().load()
@@ -95,51 +156,50 @@ class Tabbar(Module):
         else:
             abs_buffer = buffers[gui_buffer]
 
-        abs_buffer.set_text(gui_buffer.get_text())
+        if abs_buffer.loading:
+            return
+
+        abs_buffer.mark_edited()
 
         if core.last_event() != Event.FILE_OPENED:
-            core.raise_event(Event.BUFFER_TEXT_CHANGED)
+            core.post_event(
+                Event.BUFFER_TEXT_CHANGED,
+                abs_buffer,
+                self["text_change_delay"].get_value(),
+            )
         else:
             core.raise_event(None)
 
-        self.refresh()
-
-    def highlight_desynced(self):
+    def highlight_desynced(self, buffer):
         core = self.core
         tabbar = core.tabbar.tabBar()
-        tab = tabbar.currentIndex()
-        current = core.buffers.current()
-        synced = current.synchronized
+        tab = core.tabbar.indexOf(buffer.view)
+        synced = buffer.synchronized
 
         tabbar.setTabTextColor(tab, QColor(0, 0, 0) if synced else QColor(255, 0, 0))
 
-    def refresh(self):
-        super().refresh()
+    def refresh(self, event=None, payload=None):
+        super().refresh(event, payload)
 
-        core = self.core
-        tabbar = core.tabbar
-        event = core.last_event()
+        if payload is None:
+            return
 
-        if event in {Event.FILE_OPENED, Event.NEW_BUFFER_CREATED}:
-            current_link = core.buffers.current_link
-            current = core.buffers.current()
+        tabbar = self.core.tabbar
+        gui_buffer = payload.view
 
-            current_link.text_changed(self.sync_buffer)
-            current_link.set_text(current.text)
+        if event in {Event.FILE_OPENED, Event.NEW_BUFFER_CREATED}:
+            # Setting the text doesn't count as an edit
+            gui_buffer.set_text(payload.text)
+            gui_buffer.text_changed(partial(self.sync_buffer, gui_buffer))
+            payload.drop_text()
 
-            tabbar.insertTab(0, current_link, current.name)
-            tabbar.setCurrentIndex(0)
+            # Woken placeholders are in the tabbar already
+            if tabbar.indexOf(gui_buffer) == -1:
+                tabbar.insertTab(0, gui_buffer, payload.name)
+                tabbar.setCurrentIndex(0)
 
         if event == Event.FILE_SAVED_AS:
-            tabbar.setTabText(tabbar.currentIndex(), core.buffers.current().name)
-
-        if event in {
-            Event.FILE_OPENED,
-            Event.FILE_SAVED_AS,
-            Event.FILE_SAVED,
-            Event.TAB_CHANGED,
-        }:
-            core.buffers.current()._sync()
+            tabbar.setTabText(tabbar.indexOf(gui_buffer), payload.name)
 
         if event in {
             Event.NEW_BUFFER_CREATED,
@@ -147,5 +207,6 @@ class Tabbar(Module):
             Event.FILE_SAVED_AS,
             Event.FILE_SAVED,
             Event.TAB_CHANGED,
+            Event.FILE_RELOADED,
         }:
-            self.highlight_desynced()
+            self.highlight_desynced(payload)
@@ -0,0 +1,282 @@
+from collections import namedtuple
+
+from event import Event
+from module import Module
+from setting import BoolSetting, IntSetting
+
+from PyQt5.QtCore import QFileSystemWatcher, QTimer
+from PyQt5.QtWidgets import QMessageBox
+
+import os
+import zlib
+
+NAME = "File watcher"
+DESCRIPTION = "Notices changes of the open files made outside of the editor. Files without unsaved changes are read again, otherwise the editor asks what to do"
+
+DEFAULT_SETTINGS = {
+    "auto_reload": BoolSetting(
+        name="Reload unmodified files",
+        description="Read files without unsaved changes again automatically when they change on the disk",
+        value=True,
+    ),
+    "poll_interval": IntSetting(
+        name="Polling interval",
+        description="Time in milliseconds between checks of the files which can't be watched by the system",
+        value=2000,
+        min_value=100,
+        max_value=60000,
+    ),
+}
+
+TRIGGER_EVENTS = (
+    Event.FILE_OPENED,
+    Event.FILE_SAVED,
+    Event.FILE_SAVED_AS,
+    Event.TAB_CLOSED,
+)
+
+# Number of bytes at the end of a file remembered to recognize appending to it
+TAIL_SIZE = 4096
+
+# Encodings whose text can't be decoded from the middle of a file
+UNAPPENDABLE_ENCODINGS = {"utf_16", "utf_32"}
+
+# What's known about the file the last time it was read or written. Tail is the
+# checksum of its last bytes
+FileState = namedtuple("FileState", ["inode", "size", "mtime", "tail"])
+
+
+def file_state(path, tail=True):
+    """Returns the state of the file or None if it doesn't exist. Without tail
+    the file isn't read"""
+
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    return FileState(
+        stat.st_ino,
+        stat.st_size,
+        stat.st_mtime_ns,
+        tail_checksum(path, stat.st_size) if tail else None,
+    )
+
+
+def changed(old, new):
+    """Returns whether the file was changed from the old state to the new
+    one. Tails aren't compared"""
+
+    if old is None or new is None:
+        return old is not new
+
+    return old[:3] != new[:3]
+
+
+def tail_checksum(path, size):
+    """Returns the checksum of the bytes of the file before the size"""
+
+    start = max(size - TAIL_SIZE, 0)
+
+    try:
+        with open(path, mode="rb") as file:
+            file.seek(start)
+            return zlib.crc32(file.read(size - start))
+    except OSError:
+        return None
+
+
+class Watcher(Module):
+    def __init__(self, core):
+        super().__init__(
+            NAME, DESCRIPTION, DEFAULT_SETTINGS, core, events=TRIGGER_EVENTS
+        )
+
+    def load(self):
+        super().load()
+
+        # States of the watched files by their real paths
+        self.states = {}
+
+        # Paths which the system watcher failed to watch
+        self.polled = set()
+
+        # Paths the user is being asked about
+        self.asking = set()
+
+        # Buffers whose files are watched
+        self.watched = set()
+
+        # One watcher for all the files, inotify-based on Linux
+        self.watcher = QFileSystemWatcher()
+        self.watcher.fileChanged.connect(self.check)
+
+        self.timer = QTimer(self.core)
+        self.timer.timeout.connect(self.poll)
+
+        if hasattr(self.core, "buffers"):
+            for buffer in self.core.buffers.buffers.values():
+                self.watch(buffer)
+
+    def unload(self):
+        super().unload()
+
+        self.timer.stop()
+        self.timer.deleteLater()
+        self.watcher.deleteLater()
+
+    def watch(self, buffer):
+        """Starts watching the sync file of the buffer remembering its current
+        state"""
+
+        if buffer.file is None:
+            return
+
+        self.watched.add(buffer)
+
+        path = os.path.realpath(buffer.file)
+        self.states[path] = file_state(path)
+        self.rewatch(path)
+
+    def rewatch(self, path):
+        """Adds the path to the system watcher again, since it forgets files
+        which were replaced. Paths failed to be added are polled"""
+
+        self.watcher.removePath(path)
+
+        if self.watcher.addPath(path):
+            self.polled.discard(path)
+        else:
+            self.polled.add(path)
+
+        if self.polled and not self.timer.isActive():
+            self.timer.start(self["poll_interval"].get_value())
+        elif not self.polled:
+            self.timer.stop()
+
+    def unwatch_unused(self):
+        """Stops watching the files which aren't open anymore"""
+
+        used = {
+            os.path.realpath(buffer.file)
+            for buffer in self.core.buffers.buffers.values()
+            if buffer.file is not None
+        }
+
+        for path in self.states.keys() - used:
+            del self.states[path]
+            self.polled.discard(path)
+            self.watcher.removePath(path)
+
+    def buffers_of(self, path):
+        return [
+            buffer
+            for buffer in self.core.buffers.buffers.values()
+            if buffer.file is not None and os.path.realpath(buffer.file) == path
+        ]
+
+    def poll(self):
+        """Checks the files which aren't watched by the system"""
+
+        for path in tuple(self.polled):
+            if changed(self.states.get(path), file_state(path, tail=False)):
+                self.check(path)
+
+    def check(self, path):
+        """Handles a possible change of the file"""
+
+        if path not in self.states or path in self.asking:
+            return
+
+        old = self.states[path]
+        new = file_state(path, tail=False)
+
+        self.rewatch(path)
+
+        if not changed(old, new):
+            return
+
+        buffers = self.buffers_of(path)
+
+        # The state gets updated after the editor writes the file
+        if any(buffer.loading or buffer in self.core.writers for buffer in buffers):
+            return
+
+        # Removed files are polled until they appear again
+        if new is not None:
+            for buffer in buffers:
+                self.file_changed(buffer, old)
+
+        self.states[path] = file_state(path)
+
+    def file_changed(self, buffer, old):
+        """Reloads the buffer after its file was changed from the old state"""
+
+        synchronized = buffer.synchronized
+
+        if synchronized and not self["auto_reload"].get_value():
+            buffer.desync()
+            self.core.find_module("tabbar").highlight_desynced(buffer)
+            return
+
+        if not synchronized and not self.ask_reload(buffer):
+            return
+
+        offset = None
+
+        if synchronized and self.appended(buffer, old):
+            offset = old.size
+
+        self.core.reload_buffer(buffer, offset)
+
+    def appended(self, buffer, old):
+        """Returns whether the file only grew since it was in the old state.
+        Bytes before the old end are considered unchanged if their tail is"""
+
+        new = file_state(buffer.file, tail=False)
+
+        return (
+            old is not None
+            and new is not None
+            and new.inode == old.inode
+            and new.size > old.size
+            and buffer.file_encoding not in UNAPPENDABLE_ENCODINGS
+            and tail_checksum(buffer.file, old.size) == old.tail
+        )
+
+    def ask_reload(self, buffer):
+        path = os.path.realpath(buffer.file)
+        self.asking.add(path)
+
+        try:
+            answer = QMessageBox.question(
+                self.core,
+                "Tetra Code Editor",
+                f"{buffer.name} was changed outside of the editor. Reload it and lose the unsaved changes?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No,
+            )
+        finally:
+            self.asking.discard(path)
+
+        return answer == QMessageBox.Yes
+
+    def refresh(self, event=None, payload=None):
+        super().refresh(event, payload)
+
+        if payload is None:
+            return
+
+        if event in {Event.TAB_CLOSED, Event.FILE_SAVED_AS}:
+            self.watched.discard(payload)
+            self.unwatch_unused()
+
+        if event != Event.TAB_CLOSED:
+            self.watch(payload)
+
+        # Files opened in a batch get a single event, while the other ones of
+        # the batch are kept in placeholders
+        if event == Event.FILE_OPENED:
+            for buffer in tuple(self.core.buffers.buffers.values()):
+                if buffer not in self.watched:
+                    self.watch(buffer)
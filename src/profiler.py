@@ -0,0 +1,283 @@
+"""Opt-in profiling of the editor internals. It's enabled by setting the
+TETRA_PROFILE environment variable to the path of a file the collected
+metrics get dumped to on exit. If the path ends with ".json" metrics are dumped
+as JSON, otherwise as OpenMetrics text.
+
+When profiling is disabled nothing gets wrapped, so the instrumented methods
+are called directly and the cost is none"""
+
+import json
+import os
+
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+
+from PyQt5.QtWidgets import (
+    QDialog,
+    QHBoxLayout,
+    QPushButton,
+    QTableWidget,
+    QTableWidgetItem,
+    QVBoxLayout,
+)
+
+PROFILE_ENV = "TETRA_PROFILE"
+
+# Upper bounds of the latency histogram buckets in seconds
+BUCKETS = (
+    0.0001,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    float("inf"),
+)
+
+METRIC_PREFIX = "tetra_"
+
+METRIC_DESCRIPTIONS = {
+    "raise_event": "Time spent dispatching an event to the subscribed modules",
+    "refresh": "Time spent refreshing a module after an event",
+    "load": "Time spent loading a module",
+    "sync": "Time spent synchronizing a buffer with its file",
+}
+
+
+class Metric:
+    """Call counter with the latency histogram"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.buckets[bisect_left(BUCKETS, elapsed)] += 1
+
+    def cumulative_buckets(self):
+        """Returns (upper bound, number of calls not slower than it) pairs"""
+
+        total = 0
+
+        for bound, count in zip(BUCKETS, self.buckets):
+            total += count
+            yield bound, total
+
+
+class Profiler:
+    """Collects call counts and latencies of the instrumented methods"""
+
+    def __init__(self, output=None):
+        self.output = output
+        self.enabled = bool(output)
+        self.metrics = {}
+
+    def observe(self, name, labels, elapsed):
+        key = (name, labels)
+
+        try:
+            metric = self.metrics[key]
+        except KeyError:
+            metric = self.metrics[key] = Metric()
+
+        metric.observe(elapsed)
+
+    def timed(self, func, name, labels):
+        """Wraps the function so that its calls are measured. Labels is either
+        a tuple of (label, value) pairs or a function returning it for the
+        passed call arguments"""
+
+        @wraps(func)
+        def wrapped(*args, **kwargs):
+            start = perf_counter()
+
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.observe(
+                    name,
+                    labels(*args, **kwargs) if callable(labels) else labels,
+                    perf_counter() - start,
+                )
+
+        return wrapped
+
+    def instrument_core(self, core):
+        """Measures event dispatching and buffer synchronization"""
+
+        from buffer import Buffer, Sync
+
+        core.raise_event = self.timed(
+            core.raise_event,
+            "raise_event",
+            lambda event, payload=None: (("event", event_name(event)),),
+        )
+
+        if not hasattr(Buffer, "_Profiler__sync"):
+            Buffer._Profiler__sync = Buffer.sync
+            Buffer.sync = self.timed(
+                Buffer.sync,
+                "sync",
+                lambda buffer, kind=Sync.TO_FILE: (("kind", kind.name),),
+            )
+
+    def instrument_module(self, module):
+        """Measures loading and refreshing of the module"""
+
+        module.load = self.timed(module.load, "load", (("module", module.id),))
+        module.refresh = self.timed(
+            module.refresh,
+            "refresh",
+            lambda event=None, payload=None: (
+                ("module", module.id),
+                ("event", event_name(event)),
+            ),
+        )
+
+    def rows(self):
+        """Returns metrics sorted by the total time spent, the slowest first"""
+
+        return sorted(self.metrics.items(), key=lambda item: -item[1].total)
+
+    def to_json(self):
+        return json.dumps(
+            [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": metric.count,
+                    "sum": metric.total,
+                    "max": metric.max,
+                    "buckets": {
+                        format_bound(bound): count
+                        for bound, count in metric.cumulative_buckets()
+                    },
+                }
+                for (name, labels), metric in self.rows()
+            ],
+            indent=4,
+        )
+
+    def to_openmetrics(self):
+        lines = []
+        by_name = {}
+
+        for (name, labels), metric in self.metrics.items():
+            by_name.setdefault(name, []).append((labels, metric))
+
+        for name, metrics in by_name.items():
+            family = f"{METRIC_PREFIX}{name}_seconds"
+
+            lines.append(f"# TYPE {family} histogram")
+            lines.append(f"# HELP {family} {METRIC_DESCRIPTIONS[name]}")
+
+            for labels, metric in metrics:
+                for bound, count in metric.cumulative_buckets():
+                    bucket_labels = labels + (("le", format_bound(bound)),)
+                    lines.append(
+                        f"{family}_bucket{format_labels(bucket_labels)} {count}"
+                    )
+
+                lines.append(f"{family}_count{format_labels(labels)} {metric.count}")
+                lines.append(f"{family}_sum{format_labels(labels)} {metric.total}")
+
+        lines.append("# EOF")
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path=None):
+        """Dumps the collected metrics to the file"""
+
+        path = self.output if path is None else path
+        text = self.to_json() if path.endswith(".json") else self.to_openmetrics()
+
+        with open(path, mode="w") as file:
+            file.write(text)
+
+
+class ProfilerDialog(QDialog):
+    """Debug dialogue window showing the collected metrics"""
+
+    COLUMNS = ("Metric", "Labels", "Calls", "Total, ms", "Mean, ms", "Max, ms")
+
+    def __init__(self, profiler, parent=None):
+        super().__init__(parent)
+
+        self.profiler = profiler
+
+        self.setWindowTitle("Profiler")
+        self.resize(800, 500)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+
+        self.refresh_button = QPushButton("Refresh")
+        self.refresh_button.clicked.connect(self.refresh)
+
+        self.reset_button = QPushButton("Reset")
+        self.reset_button.clicked.connect(self.reset)
+
+        self.buttons_layout = QHBoxLayout()
+        self.buttons_layout.addWidget(self.refresh_button)
+        self.buttons_layout.addWidget(self.reset_button)
+
+        self.main_layout = QVBoxLayout()
+        self.main_layout.addWidget(self.table)
+        self.main_layout.addLayout(self.buttons_layout)
+
+        self.setLayout(self.main_layout)
+        self.refresh()
+
+    def refresh(self):
+        rows = self.profiler.rows()
+
+        self.table.setRowCount(len(rows))
+
+        for row, ((name, labels), metric) in enumerate(rows):
+            cells = (
+                name,
+                ", ".join(f"{label}={value}" for label, value in labels),
+                str(metric.count),
+                f"{metric.total * 1000:.2f}",
+                f"{metric.total * 1000 / metric.count:.3f}",
+                f"{metric.max * 1000:.3f}",
+            )
+
+            for column, cell in enumerate(cells):
+                self.table.setItem(row, column, QTableWidgetItem(cell))
+
+        self.table.resizeColumnsToContents()
+
+    def reset(self):
+        self.profiler.metrics.clear()
+        self.refresh()
+
+
+def event_name(event):
+    return "NONE" if event is None else event.name
+
+
+def format_bound(bound):
+    return "+Inf" if bound == float("inf") else str(bound)
+
+
+def format_labels(labels):
+    return "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+
+profiler = Profiler(os.environ.get(PROFILE_ENV))
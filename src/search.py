@@ -0,0 +1,153 @@
+"""Searching for text in the files of a directory. Files are searched in
+worker processes, so everything here must be importable and picklable without
+the running editor"""
+
+import fnmatch
+import mmap
+import os
+import re
+
+from buffer import detect_encoding
+
+# Number of bytes from the beginning of a file looked at to find out whether
+# it's binary
+BINARY_SAMPLE_SIZE = 8192
+
+# Encodings whose text may contain zero bytes
+WIDE_ENCODINGS = {"utf_16", "utf_32"}
+
+# Encodings in which ASCII patterns can be searched for in raw bytes. Unknown
+# encoding (None) is shown as UTF-8 anyway
+ASCII_COMPATIBLE_ENCODINGS = {None, "ascii", "utf_8", "utf_8_sig"}
+
+# Maximum number of characters of the matched line shown
+PREVIEW_LENGTH = 200
+
+
+def walk(root, ignored=()):
+    """Yields paths of the files in the directory and all its subdirectories.
+    Files and directories whose names match any of the ignored glob patterns
+    are skipped. Symbolic links to directories aren't followed"""
+
+    stack = [root]
+
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+
+        with entries:
+            for entry in entries:
+                if any(fnmatch.fnmatch(entry.name, pattern) for pattern in ignored):
+                    continue
+
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file():
+                        yield entry.path
+                except OSError:
+                    continue
+
+
+def compile_pattern(pattern, regex=False, case=False):
+    """Returns (text regex, bytes regex) pair. Bytes regex is None if the
+    pattern can't be searched for in raw bytes"""
+
+    source = pattern if regex else re.escape(pattern)
+    flags = 0 if case else re.IGNORECASE
+
+    return (
+        re.compile(source, flags | re.MULTILINE),
+        (
+            re.compile(source.encode(), flags | re.MULTILINE)
+            if source.isascii()
+            else None
+        ),
+    )
+
+
+def find_matches(data, regex, max_matches, decode=None):
+    """Returns (line, column, preview) matches of the regex in the text or
+    bytes. Lines are counted from zero, columns are in characters"""
+
+    matches = []
+    newline = "\n" if decode is None else b"\n"
+    line = 0
+    counted = 0
+
+    for match in regex.finditer(data):
+        start = match.start()
+
+        # Lines are counted incrementally from the previous match. Memory maps
+        # can't count, so the part between the matches is copied
+        line += data[counted:start].count(newline)
+        counted = start
+
+        line_start = data.rfind(newline, 0, start) + 1
+        line_end = data.find(newline, start)
+        line_end = len(data) if line_end == -1 else line_end
+
+        if decode is None:
+            column = start - line_start
+            preview = data[line_start:line_end]
+        else:
+            column = len(decode(data[line_start:start]))
+            preview = decode(data[line_start:line_end])
+
+        matches.append((line, column, preview.rstrip("\r")[:PREVIEW_LENGTH]))
+
+        if len(matches) == max_matches:
+            break
+
+    return matches
+
+
+def search_file(path, regexes, max_matches):
+    """Returns matches of the compiled pattern in the file. Binary files have
+    no matches"""
+
+    text_regex, bytes_regex = regexes
+
+    with open(path, mode="rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return []
+
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            encoding, _ = detect_encoding(path)
+
+            if encoding not in WIDE_ENCODINGS and b"\0" in data[:BINARY_SAMPLE_SIZE]:
+                return []
+
+            # Text of most files doesn't need to be decoded to be searched
+            if encoding in ASCII_COMPATIBLE_ENCODINGS and bytes_regex is not None:
+                return find_matches(
+                    data,
+                    bytes_regex,
+                    max_matches,
+                    lambda raw: raw.decode("utf-8", "replace"),
+                )
+
+            text = data[:].decode(encoding or "utf-8", "replace")
+
+    return find_matches(text, text_regex, max_matches)
+
+
+def search_files(paths, pattern, regex=False, case=False, max_matches=1000):
+    """Returns (path, matches) pairs of the files with matches of the pattern.
+    Files which can't be read are skipped"""
+
+    regexes = compile_pattern(pattern, regex, case)
+    results = []
+
+    for path in paths:
+        try:
+            matches = search_file(path, regexes, max_matches)
+        except (OSError, ValueError, LookupError):
+            continue
+
+        if matches:
+            results.append((path, matches))
+
+    return results
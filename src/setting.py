@@ -22,6 +22,46 @@ class Setting:
         return self.value
 
 
+class SettingsStore:
+    """In-memory store of the saved setting values. It tracks which settings
+    actually changed when they get saved and which of the changes haven't been
+    written anywhere yet. Values are stored by "module:setting" keys"""
+
+    def __init__(self):
+        self.values = {}
+        self.dirty = {}
+
+    def track(self, module):
+        """Remembers current setting values of the module as the saved ones"""
+
+        for id, setting in module.settings.items():
+            self.values[f"{module.id}:{id}"] = setting.value
+
+    def commit(self, modules):
+        """Saves current setting values of the modules and returns the change
+        set, which maps module identifiers to sets of changed setting ones"""
+
+        changes = {}
+
+        for module in modules:
+            for id, setting in module.settings.items():
+                key = f"{module.id}:{id}"
+
+                if key in self.values and self.values[key] == setting.value:
+                    continue
+
+                self.values[key] = self.dirty[key] = setting.value
+                changes.setdefault(module.id, set()).add(id)
+
+        return changes
+
+    def take_dirty(self):
+        """Returns the changes to be written and forgets about them"""
+
+        dirty, self.dirty = self.dirty, {}
+        return dirty
+
+
 class StringSetting(Setting):
     def __init__(self, name=None, description="", value=None):
         super().__init__(name, description, value)
@@ -66,7 +106,7 @@ class IntSetting(Setting):
         widget.setValue(self.get_value())
 
         widget.textChanged.connect(self.set_value)
-        widget.set_value = lambda v: widget.setValue(v)
+        widget.set_value = lambda v: widget.setValue(int(v))
 
         return widget
 
@@ -89,7 +129,7 @@ class BoolSetting(Setting):
             lambda state: widget.setText("Enabled" if state else "Disabled")
         )
         widget.stateChanged.connect(self.set_value)
-        widget.set_value = lambda v: widget.setCheckState(v)
+        widget.set_value = lambda v: widget.setChecked(bool(int(v)))
         return widget
 
 
@@ -144,5 +184,5 @@ class ColorSetting(Setting):
         widget = QLineEdit()
         widget.setText("" if self.value is None else self.value)
         widget.textChanged.connect(self.set_value)
-        widget.set_value = lambda v: widget.setText(v)
+        widget.set_value = lambda v: widget.setText("" if v is None else v)
         return widget
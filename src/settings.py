@@ -1,4 +1,4 @@
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import (
     QCheckBox,
     QFileDialog,
@@ -7,6 +7,7 @@ from PyQt5.QtWidgets import (
     QMainWindow,
     QPushButton,
     QScrollArea,
+    QToolButton,
     QVBoxLayout,
     QWidget,
 )
@@ -15,17 +16,33 @@ from utils import QHSeparationLine
 
 import csv
 
+# Height in pixels a setting row is supposed to take until it gets built
+SETTING_ROW_HEIGHT = 60
+
 
 class ModuleSettings(QWidget):
+    """Settings section of the module. Rows of the settings get built only
+    when the expanded section comes into view"""
+
     def __init__(self, module, parent=None):
         super().__init__(parent)
 
         self.module = module
+        self.controls = {}
+        self.body = None
+        self.placeholder = None
 
         self.main_layout = QVBoxLayout()
 
         self.title_layout = QHBoxLayout()
 
+        self.expand_button = QToolButton()
+        self.expand_button.setArrowType(Qt.DownArrow)
+        self.expand_button.setAutoRaise(True)
+        self.expand_button.setCheckable(True)
+        self.expand_button.setChecked(True)
+        self.expand_button.toggled.connect(self.expand)
+
         self.title = QLabel(module.name)
         self.title.setStyleSheet("font-size: 16pt; font-weight: bold;")
         self.title.setToolTip(module.description)
@@ -37,10 +54,57 @@ class ModuleSettings(QWidget):
         self.state.setChecked(module.enabled)
         self.state.stateChanged.connect(self.turn_module)
 
+        self.title_layout.addWidget(self.expand_button, 0)
         self.title_layout.addWidget(self.title, 10)
         self.title_layout.addWidget(self.state, 1)
 
         self.main_layout.addLayout(self.title_layout)
+        self.setLayout(self.main_layout)
+
+        self.clear()
+
+    def is_expanded(self):
+        return self.expand_button.isChecked()
+
+    def is_built(self):
+        return self.body is not None
+
+    def expand(self, state):
+        """Shows rows of the settings if state's True, else hides them"""
+
+        self.expand_button.setArrowType(Qt.DownArrow if state else Qt.RightArrow)
+
+        if state:
+            self.build()
+
+        (self.placeholder if self.body is None else self.body).setVisible(state)
+
+    def clear(self):
+        """Replaces rows of the settings with a placeholder of about the same
+        height"""
+
+        if self.body is not None:
+            self.main_layout.removeWidget(self.body)
+            self.body.deleteLater()
+            self.body = None
+            self.controls = {}
+
+        self.placeholder = QWidget()
+        self.placeholder.setFixedHeight(SETTING_ROW_HEIGHT * len(self.module.settings))
+        self.placeholder.setVisible(self.is_expanded())
+        self.main_layout.addWidget(self.placeholder)
+
+        self.expand_button.setVisible(len(self.module.settings) != 0)
+
+    def build(self):
+        """Builds rows of the settings unless they are built already"""
+
+        if self.body is not None:
+            return
+
+        module = self.module
+        body_layout = QVBoxLayout()
+        body_layout.setContentsMargins(0, 0, 0, 0)
 
         for id, setting in module.settings.items():
             title = QLabel(id if setting.name is None else setting.name)
@@ -66,7 +130,7 @@ class ModuleSettings(QWidget):
             control_widget.setFixedWidth(200)
 
             reset_setting = QPushButton("Reset")
-            reset_setting.setProperty("setting", control_widget.objectName())
+            reset_setting.setProperty("setting", id)
             reset_setting.clicked.connect(self.reset_setting)
 
             layout = QHBoxLayout()
@@ -77,24 +141,52 @@ class ModuleSettings(QWidget):
             widget = QWidget()
             widget.setLayout(layout)
 
-            self.main_layout.addWidget(widget)
+            body_layout.addWidget(widget)
+            self.controls[id] = control_widget
 
-        self.setLayout(self.main_layout)
+        self.body = QWidget()
+        self.body.setLayout(body_layout)
+
+        self.main_layout.replaceWidget(self.placeholder, self.body)
+        self.placeholder.deleteLater()
+        self.placeholder = None
+
+    def sync(self):
+        """Brings the widgets in line with the module state and settings"""
+
+        self.refetch_module()
+
+        self.state.blockSignals(True)
+        self.state.setChecked(self.module.enabled)
+        self.state.setText("Enabled" if self.module.enabled else "Disabled")
+        self.state.blockSignals(False)
+
+        for id, control_widget in self.controls.items():
+            control_widget.set_value(self.module.settings[id].value)
+
+    def refetch_module(self):
+        """Enabling a placeholder puts the real module in its place, and the
+        settings rows of the placeholder don't fit the real module"""
+
+        module = self.module.core.find_module(self.module.id)
+
+        if module is self.module:
+            return
+
+        self.module = module
+        self.clear()
 
     def turn_module(self, state):
         self.state.setText("Enabled" if state else "Disabled")
         self.module.toggle(state)
+        self.refetch_module()
 
-    def reset_setting(self):
-        button = self.sender()
+        if self.is_expanded() and self.isVisible():
+            self.build()
 
-        id = button.property("setting")
-        clean_id = id.split("__")[-1]
-
-        default = self.module.default_settings[clean_id]
-
-        widget = self.findChild(QWidget, id, Qt.FindChildrenRecursively)
-        widget.set_value(default.value)
+    def reset_setting(self):
+        id = self.sender().property("setting")
+        self.controls[id].set_value(self.module.default_settings[id].value)
 
 
 class Settings(QMainWindow):
@@ -129,11 +221,16 @@ class Settings(QMainWindow):
 
         self.layout.addWidget(QHSeparationLine())
 
+        self.sections = []
+
         for module in filter(
             lambda m: m.can_disable or len(m.settings) != 0, core.modules.values()
         ):
-            settings = ModuleSettings(module, self)
-            self.layout.addWidget(settings)
+            section = ModuleSettings(module, self)
+            section.expand_button.toggled.connect(self.build_visible_later)
+
+            self.sections.append(section)
+            self.layout.addWidget(section)
             self.layout.addWidget(QHSeparationLine())
 
         self.layout_widget = QWidget()
@@ -145,13 +242,59 @@ class Settings(QMainWindow):
         self.scroll.setWidgetResizable(True)
         self.scroll.setWidget(self.layout_widget)
 
+        self.scroll.verticalScrollBar().valueChanged.connect(self.build_visible)
+
         self.setCentralWidget(self.scroll)
         self.installEventFilter(self)
 
+    def sync(self):
+        """Brings the already built widgets in line with the modules"""
+
+        for section in self.sections:
+            section.sync()
+
+    def build_visible(self):
+        """Builds the expanded sections which are in the viewport"""
+
+        built = True
+
+        # Built sections change their heights and move the following ones
+        while built:
+            built = False
+
+            self.layout.activate()
+
+            top = self.scroll.verticalScrollBar().value()
+            bottom = top + self.scroll.viewport().height()
+
+            for section in self.sections:
+                geometry = section.geometry()
+
+                if (
+                    not section.is_built()
+                    and section.is_expanded()
+                    and geometry.bottom() >= top
+                    and geometry.top() <= bottom
+                ):
+                    section.build()
+                    built = True
+
+    def build_visible_later(self):
+        QTimer.singleShot(0, self.build_visible)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.build_visible()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.build_visible()
+
     def save(self):
-        for module in self.core.modules.values():
-            module.save_settings()
-        self.core.raise_event(Event.SETTINGS_SAVED)
+        changes = self.core.save_settings(self.core.modules.values())
+
+        if changes:
+            self.core.raise_event(Event.SETTINGS_SAVED, changes)
 
     def closeEvent(self, event) -> None:
         self.save()
@@ -174,9 +317,13 @@ class Settings(QMainWindow):
             for id, value in reader:
                 module = id.split(":")[0]
                 id = id.split(":")[-1]
+
+                if module not in modules or id not in modules[module].settings:
+                    continue
+
                 modules[module][id].value = value
 
-        self.core.raise_event(Event.SETTINGS_SAVED)
+        self.save()
         self.close()
 
     def export_settings(self):
@@ -189,6 +336,8 @@ class Settings(QMainWindow):
         if path == "":
             return
 
+        self.core.flush_settings(wait=True)
+
         cur = self.core.con.cursor()
 
         with open(path, mode="w", newline="") as csvfile:
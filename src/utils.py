@@ -20,17 +20,18 @@ class FileType(Enum):
     def from_ext(cls, ext):
         """Returns FileType enum variant according to the passed file extension"""
 
-        assignments = {
-            "py": cls.PYTHON,
-            "json": cls.JSON,
-            "sql": cls.SQL,
-            "xml": cls.XML,
-            "html": cls.HTML,
-            "yaml": cls.YAML,
-            "md": cls.MARKDOWN,
-        }
-
-        return assignments[ext] if ext in assignments else cls.UNKNOWN
+        return FILE_TYPE_EXTENSIONS.get(ext, cls.UNKNOWN)
+
+
+FILE_TYPE_EXTENSIONS = {
+    "py": FileType.PYTHON,
+    "json": FileType.JSON,
+    "sql": FileType.SQL,
+    "xml": FileType.XML,
+    "html": FileType.HTML,
+    "yaml": FileType.YAML,
+    "md": FileType.MARKDOWN,
+}
 
 
 class QHSeparationLine(QFrame):
@@ -0,0 +1,164 @@
+"""Background workers moving heavy file input-output off the GUI thread"""
+
+import sqlite3
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from buffer import compress_text, decode_text, detect_encoding, file_stat, write_file
+
+# Number of characters read from a file at once
+CHUNK_SIZE = 1 << 20
+
+# Number of files read at once when opening many of them
+OPEN_THREADS = 16
+
+
+def read_compressed(path, size_limit, cached=None):
+    """Detects encoding of the file and reads it. Returns (encoding, confirmed,
+    file_stat the encoding was detected for, compressed text) where the text
+    is None if the file is bigger than the limit. Cached is (size, mtime,
+    encoding, confirmed) remembered for the file, the encoding isn't detected
+    again if the file wasn't changed since then"""
+
+    stat = file_stat(path)
+
+    if cached is not None and tuple(cached[:2]) == stat:
+        encoding, confirmed = cached[2:]
+    else:
+        encoding, confirmed = detect_encoding(path)
+
+    if stat[0] > size_limit:
+        return encoding, confirmed, stat, None
+
+    with open(path, mode="rb") as file:
+        data = file.read()
+
+    text, encoding, confirmed = decode_text(data, encoding, confirmed)
+
+    return encoding, confirmed, stat, compress_text(text)
+
+
+class FileReader(QThread):
+    """Reads the file chunk by chunk in background. Every read chunk gets
+    emitted with the number of bytes read so far. Reading stops after
+    cancellation. Bytes which don't fit the encoding are escaped unless it's
+    confirmed, since a guessed one may not fit the rest of the file"""
+
+    chunk_read = pyqtSignal(str, int)
+
+    def __init__(self, path, encoding=None, confirmed=False, chunk_size=CHUNK_SIZE):
+        super().__init__()
+
+        self.path = path
+        self.encoding = encoding
+        self.confirmed = confirmed
+        self.chunk_size = chunk_size
+        self.error = None
+        self.canceled = False
+
+    def cancel(self):
+        """Stops reading. Chunks already emitted should be ignored by the
+        receiver checking the canceled flag"""
+
+        self.canceled = True
+        self.requestInterruption()
+
+    def run(self):
+        # Files with unknown encoding are shown as UTF-8
+        encoding = self.encoding or "utf-8"
+        errors = "strict" if self.confirmed else "backslashreplace"
+
+        try:
+            with open(self.path, mode="r", encoding=encoding, errors=errors) as file:
+                while not self.isInterruptionRequested():
+                    text = file.read(self.chunk_size)
+
+                    if text == "":
+                        break
+
+                    self.chunk_read.emit(text, file.buffer.tell())
+        except (OSError, UnicodeError, LookupError) as error:
+            self.error = error
+
+
+class FileOpener(QThread):
+    """Reads the files in a pool of threads in background. Every file gets
+    emitted with its index in the paths as soon as it's read, so they come in
+    the order of completion. Either the result of read_compressed or the error
+    is None. Cached are the remembered encodings by the paths"""
+
+    file_read = pyqtSignal(int, object, object)
+
+    def __init__(self, paths, size_limit, cached=None, threads=OPEN_THREADS):
+        super().__init__()
+
+        self.paths = paths
+        self.size_limit = size_limit
+        self.cached = {} if cached is None else cached
+        self.threads = threads
+
+    def run(self):
+        with ThreadPoolExecutor(self.threads) as pool:
+            futures = {
+                pool.submit(
+                    read_compressed, path, self.size_limit, self.cached.get(path)
+                ): idx
+                for idx, path in enumerate(self.paths)
+            }
+
+            for future in as_completed(futures):
+                if self.isInterruptionRequested():
+                    for pending in futures:
+                        pending.cancel()
+
+                    break
+
+                try:
+                    self.file_read.emit(futures[future], future.result(), None)
+                except (OSError, UnicodeError, LookupError) as error:
+                    self.file_read.emit(futures[future], None, error)
+
+
+class FileWriter(QThread):
+    """Encodes the text and atomically writes it to the file in background"""
+
+    def __init__(self, path, text, encoding=None, fsync=False):
+        super().__init__()
+
+        self.path = path
+        self.text = text
+        self.encoding = encoding
+        self.fsync = fsync
+        self.error = None
+
+    def run(self):
+        try:
+            write_file(self.path, self.text, self.encoding, self.fsync)
+        except (OSError, UnicodeError, LookupError) as error:
+            self.error = error
+
+
+class SettingsWriter(QThread):
+    """Writes (value, id) rows of the settings to the database in a single
+    transaction in background. The thread uses its own connection"""
+
+    def __init__(self, path, rows):
+        super().__init__()
+
+        self.path = path
+        self.rows = rows
+        self.error = None
+
+    def run(self):
+        try:
+            con = sqlite3.connect(self.path)
+
+            try:
+                with con:
+                    con.executemany("UPDATE settings SET value=? WHERE id=?", self.rows)
+            finally:
+                con.close()
+        except sqlite3.Error as error:
+            self.error = error
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Modules of the editor import each other as top-level ones
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
@@ -0,0 +1,126 @@
+import codecs
+import os
+import stat
+
+import pytest
+
+from buffer import (
+    ENCODING_SAMPLE_SIZE,
+    Buffer,
+    decode_text,
+    detect_encoding,
+    write_file,
+)
+
+
+def write(tmp_path, data, name="file.txt"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "bom, encoding",
+    [
+        (codecs.BOM_UTF8, "utf_8_sig"),
+        (codecs.BOM_UTF16_LE, "utf_16"),
+        (codecs.BOM_UTF16_BE, "utf_16"),
+        (codecs.BOM_UTF32_LE, "utf_32"),
+        (codecs.BOM_UTF32_BE, "utf_32"),
+    ],
+)
+def test_detect_encoding_by_bom(tmp_path, bom, encoding):
+    assert detect_encoding(write(tmp_path, bom + b"a")) == (encoding, True)
+
+
+def test_detect_encoding_whole_utf8_file_is_confirmed(tmp_path):
+    path = write(tmp_path, "привет, мир\n".encode())
+    assert detect_encoding(path) == ("utf_8", True)
+
+
+def test_detect_encoding_utf8_sample_is_not_confirmed(tmp_path):
+    path = write(tmp_path, b"a" * ENCODING_SAMPLE_SIZE + b"\xe9")
+    assert detect_encoding(path) == ("utf_8", False)
+
+
+def test_detect_encoding_sample_cut_in_multibyte_character(tmp_path):
+    data = b"a" * (ENCODING_SAMPLE_SIZE - 1) + "я".encode()
+    assert detect_encoding(write(tmp_path, data)) == ("utf_8", False)
+
+
+def test_detect_encoding_guesses_other_encodings(tmp_path):
+    data = "Съешь же ещё этих мягких французских булок\n".encode("cp1251") * 50
+    encoding, confirmed = detect_encoding(write(tmp_path, data))
+
+    assert not confirmed
+    assert data.decode(encoding) == data.decode("cp1251")
+
+
+def test_decode_text_guesses_again_if_encoding_does_not_fit():
+    data = b"a" * ENCODING_SAMPLE_SIZE + b"\xe9"
+    text, encoding, confirmed = decode_text(data, "utf_8", False)
+
+    assert encoding not in {None, "utf_8"}
+    assert not confirmed
+    assert text == data.decode(encoding)
+
+
+def test_decode_text_escapes_content_of_unknown_encoding():
+    assert decode_text(b"a\xff", None, False) == ("a\\xff", None, False)
+
+
+def test_decode_text_confirmed_encoding_must_fit():
+    with pytest.raises(UnicodeDecodeError):
+        decode_text(b"\xef\xbb\xbfa\xff", "utf_8_sig", True)
+
+
+def test_sync_from_file_with_invalid_utf8_after_sample(tmp_path):
+    data = b"x = 1\n" * 12000 + b"# caf\xe9\n"
+    buffer = Buffer(sync_file=write(tmp_path, data, "big.py"))
+
+    assert buffer.file_encoding != "utf_8"
+    assert buffer.text == data.decode(buffer.file_encoding)
+    assert buffer.synchronized
+
+
+def test_write_file_replaces_content(tmp_path):
+    path = write(tmp_path, b"old content")
+    write_file(path, "новое", "cp1251")
+
+    assert (tmp_path / "file.txt").read_bytes() == "новое".encode("cp1251")
+    assert os.listdir(tmp_path) == ["file.txt"]
+
+
+def test_write_file_creates_file_as_utf8(tmp_path):
+    path = str(tmp_path / "new.txt")
+    write_file(path, "ünïcode", fsync=True)
+
+    assert (tmp_path / "new.txt").read_text("utf-8") == "ünïcode"
+
+
+def test_write_file_keeps_permissions(tmp_path):
+    path = write(tmp_path, b"#!/bin/sh\n", "script.sh")
+    os.chmod(path, 0o751)
+    write_file(path, "#!/bin/sh\necho\n")
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o751
+
+
+def test_write_file_failure_keeps_original(tmp_path):
+    path = write(tmp_path, b"original")
+
+    with pytest.raises(UnicodeEncodeError):
+        write_file(path, "не ascii", "ascii")
+
+    assert (tmp_path / "file.txt").read_bytes() == b"original"
+    assert os.listdir(tmp_path) == ["file.txt"]
+
+
+def test_write_file_through_symlink_writes_target(tmp_path):
+    target = write(tmp_path, b"old")
+    link = tmp_path / "link.txt"
+    link.symlink_to(target)
+    write_file(str(link), "new")
+
+    assert link.is_symlink()
+    assert (tmp_path / "file.txt").read_text() == "new"
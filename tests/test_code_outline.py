@@ -0,0 +1,72 @@
+import pickle
+
+from code_outline import parse_outline
+
+SOURCE = """\
+import os
+
+
+class Editor:
+    def open(self):
+        def read():
+            pass
+
+    async def save(self):
+        pass
+
+
+if os.name == "nt":
+
+    @staticmethod
+    def helper():
+        callback = lambda: None
+
+try:
+    class Fallback: pass
+except ImportError:
+    pass
+"""
+
+
+def test_symbols_are_nested():
+    outline, error = parse_outline(SOURCE)
+
+    assert error is None
+    assert outline == [
+        (
+            "class",
+            "Editor",
+            3,
+            0,
+            [
+                ("def", "open", 4, 4, [("def", "read", 5, 8, [])]),
+                ("async def", "save", 8, 4, []),
+            ],
+        ),
+        ("def", "helper", 15, 4, []),
+        ("class", "Fallback", 19, 4, []),
+    ]
+
+
+def test_bytes_and_text_give_same_outline():
+    assert parse_outline(SOURCE.encode()) == parse_outline(SOURCE)
+
+
+def test_syntax_error_tells_line():
+    outline, error = parse_outline("def ok(): pass\n\ndef broken(:\n")
+
+    assert outline is None
+    assert error.startswith("line 3: ")
+
+
+def test_null_bytes_are_reported():
+    outline, error = parse_outline(b"x = 1\0\n")
+
+    assert outline is None
+    assert error
+
+
+def test_result_is_picklable():
+    result = parse_outline(SOURCE)
+
+    assert pickle.loads(pickle.dumps(result)) == result
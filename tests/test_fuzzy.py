@@ -0,0 +1,84 @@
+import os
+
+from fuzzy import PathIndex, set_bits, to_bits
+
+PATHS = [
+    os.path.join("src", "core.py"),
+    os.path.join("src", "modules", "quick_open", "__init__.py"),
+    os.path.join("docs", "score.txt"),
+    "README.md",
+    "setup.py",
+]
+
+
+def test_bits():
+    bits = to_bits([True, False, True] + [False] * 20 + [True])
+
+    assert bits == 0b1 << 23 | 0b101
+    assert list(set_bits(bits)) == [0, 2, 23]
+    assert list(set_bits(0)) == []
+
+
+def test_rank_requires_all_characters_in_order():
+    index = PathIndex("/root", PATHS)
+
+    assert index.rank("srccore") == [os.path.join("src", "core.py")]
+    assert index.rank("eroc") == []
+    assert index.rank("zzz") == []
+
+
+def test_rank_prefers_query_in_file_name():
+    index = PathIndex("/root", PATHS)
+
+    assert index.rank("core")[:2] == [
+        os.path.join("src", "core.py"),
+        os.path.join("docs", "score.txt"),
+    ]
+    assert index.rank("init")[0] == PATHS[1]
+
+
+def test_rank_ignores_case_and_spaces():
+    index = PathIndex("/root", PATHS)
+
+    assert index.rank("READ me") == ["README.md"]
+
+
+def test_rank_prefers_recent_paths():
+    index = PathIndex("/root", ["a/x.py", "b/x.py"])
+
+    assert index.rank("x.py") == ["a/x.py", "b/x.py"]
+    assert index.rank("x.py", recent=["b/x.py"]) == ["b/x.py", "a/x.py"]
+
+
+def test_rank_empty_query():
+    index = PathIndex("/root", PATHS)
+
+    assert index.rank("", limit=3) == ["setup.py", "README.md", PATHS[0]]
+    assert index.rank("", recent=["gone.py", PATHS[1]], limit=2) == [
+        PATHS[1],
+        "setup.py",
+    ]
+    assert index.rank("", recent=PATHS, limit=2) == PATHS[:2]
+
+
+def test_add_and_remove():
+    index = PathIndex("/root", PATHS)
+
+    index.add("zebra.py")
+    index.add("zebra.py")
+    index.remove("setup.py")
+    index.remove("missing.py")
+
+    assert len(index) == len(PATHS)
+    assert "zebra.py" in index
+    assert "setup.py" not in index
+    assert index.rank("zebra") == ["zebra.py"]
+    assert index.rank("setup") == []
+    assert "setup.py" not in index.rank("")
+
+
+def test_candidates_find_long_paths_by_file_name():
+    deep = os.path.join(*["dir"] * 50, "needle.py")
+    index = PathIndex("/root", [f"n{idx}e.py" for idx in range(300)] + [deep])
+
+    assert index.rank("ne")[0] == deep
@@ -0,0 +1,17 @@
+from highlighter import byte_tokens
+
+
+def test_byte_tokens_of_ascii_text():
+    tokens = [(0, 3, 1), (4, 6, 2)]
+
+    assert list(byte_tokens("abc de", tokens)) == tokens
+
+
+def test_byte_tokens_of_non_ascii_text():
+    text = "é = 'привет' # ü"
+    tokens = [(0, 1, 1), (4, 12, 2), (13, 16, 3)]
+
+    assert list(byte_tokens(text, tokens)) == [
+        (len(text[:start].encode()), len(text[:end].encode()), style)
+        for start, end, style in tokens
+    ]
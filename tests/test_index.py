@@ -0,0 +1,112 @@
+import os
+
+import pytest
+
+from index import (
+    MAX_INDEXED_SIZE,
+    TrigramIndex,
+    index_file,
+    query_trigrams,
+    required_literals,
+    trigrams,
+)
+
+
+@pytest.mark.parametrize(
+    "pattern, literals",
+    [
+        ("foo.*bar", ["foo", "bar"]),
+        (r"foo\.py", ["foo.py"]),
+        ("[ab]cd", ["", "cd"]),
+        ("(foo)bar", ["", "bar"]),
+        ("a|b", ["", ""]),
+    ],
+)
+def test_required_literals_of_regex(pattern, literals):
+    assert required_literals(pattern, regex=True) == literals
+
+
+def test_required_literals_of_plain_text():
+    assert required_literals("a.*b", regex=False) == ["a.*b"]
+
+
+def test_required_literals_of_invalid_regex():
+    assert required_literals("(", regex=True) == []
+
+
+def test_query_trigrams_ignore_case_of_ascii_letters():
+    assert query_trigrams("AbCd") == trigrams(b"abcd")
+    assert query_trigrams("ab") == set()
+
+
+def test_query_trigrams_skip_non_ascii_unless_case_matters():
+    assert query_trigrams("привет") == set()
+    assert query_trigrams("привет", case=True) == trigrams("привет".encode())
+
+
+def entry(path, data):
+    path.write_bytes(data)
+    return index_file(str(path))
+
+
+def test_index_file(tmp_path):
+    path, mtime, size, found = entry(tmp_path / "a.py", b"Hello")
+    stat = os.stat(path)
+
+    assert (mtime, size) == (stat.st_mtime_ns, stat.st_size)
+    assert found == trigrams(b"hello")
+
+
+def test_index_file_skips_binary_and_big_files(tmp_path):
+    assert entry(tmp_path / "a.bin", b"ab\0cd")[3] == set()
+    assert entry(tmp_path / "big.txt", b"a" * (MAX_INDEXED_SIZE + 1))[3] is None
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = TrigramIndex(str(tmp_path / "index.db"))
+    yield index
+    index.close()
+
+
+def test_candidates(tmp_path, index):
+    index.update("/root/a.py", 1, 1, trigrams(b"needle in a haystack"))
+    index.update("/root/b.py", 1, 1, trigrams(b"just hay"))
+    index.update("/root/big.txt", 1, 1, None)
+
+    ids = {path: entry[0] for path, entry in index.files_under("/root").items()}
+
+    assert index.candidates(query_trigrams("NEEDLE")) == {
+        ids["/root/a.py"],
+        ids["/root/big.txt"],
+    }
+    assert index.candidates(query_trigrams("hay")) == set(ids.values())
+    assert index.candidates(set()) is None
+
+
+def test_update_replaces_trigrams(index):
+    index.update("/root/a.py", 1, 1, trigrams(b"needle"))
+    index.update("/root/a.py", 2, 2, trigrams(b"thread"))
+
+    assert index.candidates(query_trigrams("needle")) == set()
+    assert len(index.candidates(query_trigrams("thread"))) == 1
+    assert index.files_under("/root")["/root/a.py"][1:] == (2, 2)
+
+
+def test_remove_and_invalidate(index):
+    index.update("/root/a.py", 1, 1, trigrams(b"needle"))
+    index.update("/root/b.py", 1, 1, trigrams(b"needle"))
+
+    index.remove(["/root/a.py"])
+    index.invalidate("/root/b.py")
+
+    assert list(index.files_under("/root")) == ["/root/b.py"]
+    assert index.files_under("/root")["/root/b.py"][1] == -1
+    assert len(index.candidates(query_trigrams("needle"))) == 1
+
+
+def test_files_under_excludes_sibling_directories(index):
+    index.update("/root/a/x.py", 1, 1, set())
+    index.update("/root/ab/y.py", 1, 1, set())
+
+    assert list(index.files_under("/root/a")) == ["/root/a/x.py"]
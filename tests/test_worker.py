@@ -0,0 +1,67 @@
+from buffer import decompress_text, file_stat
+from worker import FileReader, read_compressed
+
+
+def test_read_compressed(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("привет\n", encoding="utf-8")
+
+    encoding, confirmed, stat, compressed = read_compressed(str(path), 1 << 20)
+
+    assert (encoding, confirmed) == ("utf_8", True)
+    assert stat == file_stat(str(path))
+    assert decompress_text(compressed) == "привет\n"
+
+
+def test_read_compressed_skips_text_of_big_files(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"abc\n")
+
+    assert read_compressed(str(path), 2)[3] is None
+
+
+def test_read_compressed_uses_cached_encoding(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("привет\n", encoding="utf-8")
+    stat = file_stat(str(path))
+
+    result = read_compressed(str(path), 1 << 20, (*stat, "latin_1", True))
+
+    assert result[:2] == ("latin_1", True)
+    assert decompress_text(result[3]) == "привет\n".encode().decode("latin_1")
+
+
+def test_read_compressed_ignores_outdated_cache(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("привет\n", encoding="utf-8")
+    size, mtime = file_stat(str(path))
+
+    result = read_compressed(str(path), 1 << 20, (size, mtime - 1, "latin_1", True))
+
+    assert result[:2] == ("utf_8", True)
+
+
+def read_chunks(path, encoding, confirmed):
+    reader = FileReader(str(path), encoding, confirmed, chunk_size=4)
+    chunks = []
+    reader.chunk_read.connect(lambda text, read: chunks.append(text))
+    reader.run()
+
+    return "".join(chunks), reader.error
+
+
+def test_file_reader_escapes_bytes_not_fitting_guessed_encoding(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes("привет".encode() + b"\xff\n")
+
+    assert read_chunks(path, "utf_8", False) == ("привет\\xff\n", None)
+    assert read_chunks(path, None, False) == ("привет\\xff\n", None)
+
+
+def test_file_reader_fails_on_bytes_not_fitting_confirmed_encoding(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes("привет".encode() + b"\xff\n")
+
+    text, error = read_chunks(path, "utf_8", True)
+
+    assert isinstance(error, UnicodeDecodeError)